@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'api'
+
+    def ready(self):
+        from . import connections  # noqa: F401
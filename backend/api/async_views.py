@@ -0,0 +1,113 @@
+"""Асинхронные маршруты для частых запросов на чтение под ASGI.
+
+В Django 3.2 нет асинхронного ORM, а синхронные представления под ASGI
+выполняются по очереди в одном потоке. Здесь действия вьюсетов
+запускаются в ограниченном пуле потоков: медленный клиент держит только
+корутину, а запросы к базе идут параллельно, не больше
+ASYNC_READ_THREADS соединений на воркер. Потоковые ответы отдаются по
+одному куску через foodgram.asgi.StreamingASGIHandler.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+
+from .connections import close_unusable_connections
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_READ_THREADS,
+            thread_name_prefix='async-reads'
+        )
+    return _executor
+
+
+def database_sync_to_async(func):
+    """Выполняет func в пуле; соединения потока закрываются так же,
+    как в начале и конце обычного запроса"""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        close_unusable_connections()
+        # Метрики и детектор запроса приходят через contextvars:
+        # sync_to_async копирует контекст в поток пула
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False,
+                         executor=_get_executor())
+
+
+def _rendered(view):
+    """Рендер тоже идет в пуле: в цикле событий запросы к базе
+    запрещены"""
+    def run(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+
+    return run
+
+
+def _next_chunk(chunks):
+    return next(chunks, None)
+
+
+async def _stream(chunks):
+    """Куски синхронного итератора по одному, без буфера в памяти.
+
+    Итератор может читать курсор queryset.iterator(), поэтому все куски
+    берутся в одном своем потоке, и его соединение закрывается в конце.
+    """
+    executor = ThreadPoolExecutor(max_workers=1,
+                                  thread_name_prefix='async-stream')
+    pull = sync_to_async(_next_chunk, thread_sensitive=False,
+                         executor=executor)
+    try:
+        while True:
+            chunk = await pull(chunks)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(connections.close_all, thread_sensitive=False,
+                            executor=executor)()
+        executor.shutdown(wait=False)
+
+
+def async_view(viewset, actions, basename, detail):
+    """Аналог маршрута роутера DRF с теми же параметрами действий"""
+    initkwargs = {'basename': basename, 'detail': detail}
+    for action in actions.values():
+        initkwargs.update(getattr(getattr(viewset, action), 'kwargs', {}))
+    view = viewset.as_view(actions, **initkwargs)
+
+    async def handler(request, *args, **kwargs):
+        response = await database_sync_to_async(_rendered(view))(
+            request, *args, **kwargs
+        )
+        if response.streaming and isinstance(request, ASGIRequest):
+            # Обработчик ASGI Django 3.2 перебирает потоковый ответ прямо
+            # в цикле событий; куски отдает StreamingASGIHandler
+            response.async_streaming_content = _stream(
+                response.streaming_content
+            )
+            response.streaming_content = ()
+        return response
+
+    handler.csrf_exempt = True
+    handler.cls = viewset
+    handler.actions = actions
+    handler.initkwargs = initkwargs
+    return handler
@@ -0,0 +1,61 @@
+import threading
+from bisect import bisect_left
+
+from recipe.models import Ingredient
+from recipe.versions import INGREDIENTS, get_version
+
+
+def normalize(name):
+    return name.strip().casefold()
+
+
+class IngredientIndex:
+    """Отсортированный по нормализованному названию список ингредиентов.
+
+    Строится при первом обращении и пересобирается, когда меняется
+    версия ингредиентов в общем кэше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = ([], [])
+
+    def _build(self):
+        rows = sorted(
+            (normalize(name), ingredient_id, name, unit)
+            for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).order_by().iterator()
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': ingredient_id, 'name': name, 'measurement_unit': unit}
+            for _, ingredient_id, name, unit in rows
+        ]
+        return keys, items
+
+    def _actual(self):
+        version = get_version(INGREDIENTS)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._data = self._build()
+                    self._version = version
+        return self._data
+
+    def all(self):
+        return self._actual()[1]
+
+    def search(self, prefix, limit=None):
+        keys, items = self._actual()
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return items[start:end]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,333 @@
+import base64
+import io
+import json
+import math
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipe import counters, feed, popularity, shopping_list
+from recipe.models import (Favorite, Follow, Ingredient, Recipe,
+                           RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+SIZES = {
+    'small': 1_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+}
+BENCH_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+BATCH_SIZE = 5_000
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F9A62B', 'dessert'),
+)
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def _batched(objects, model):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def clear_dataset():
+    User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+
+@transaction.atomic
+def seed_dataset(recipes, seed=42, stdout=None):
+    """Детерминированный набор данных для бенчмарков"""
+    rng = random.Random(seed)
+    clear_dataset()
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    if not ingredient_ids:
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{BENCH_PREFIX}ingredient {i}',
+                       measurement_unit='г')
+            for i in range(500)
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('id',
+                                                             flat=True))
+
+    users_total = max(10, recipes // 20)
+    password = make_password(BENCH_PASSWORD)
+    _batched((
+        User(username=f'{BENCH_PREFIX}{i}',
+             email=f'{BENCH_PREFIX}{i}@example.com',
+             first_name='Bench', last_name=str(i), password=password)
+        for i in range(users_total)
+    ), User)
+    user_ids = list(User.objects.filter(
+        username__startswith=BENCH_PREFIX
+    ).order_by('id').values_list('id', flat=True))
+
+    _batched((
+        Recipe(author_id=user_ids[i % users_total],
+               name=f'Рецепт {i}',
+               description=f'Описание рецепта номер {i}',
+               image='images/bench.png',
+               cooking_time=rng.randint(1, 180))
+        for i in range(recipes)
+    ), Recipe)
+    recipe_ids = list(Recipe.objects.filter(
+        author__username__startswith=BENCH_PREFIX
+    ).order_by('id').values_list('id', flat=True))
+
+    _batched((
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(1, 2))
+    ), Recipe.tags.through)
+    _batched((
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(ingredient_ids, rng.randint(3, 8))
+    ), RecipeIngredient)
+
+    _batched((
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rng.sample(recipe_ids, 10)
+    ), Favorite)
+    _batched((
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id in user_ids
+        for recipe_id in rng.sample(recipe_ids, 5)
+    ), ShoppingCart)
+    _batched((
+        Follow(user_id=user_id, following_id=following_id)
+        for user_id in user_ids
+        for following_id in rng.sample(user_ids, 5)
+        if following_id != user_id
+    ), Follow)
+    shopping_list.rebuild(user_ids)
+    counters.recount()
+    counters.update_tag_masks(Recipe.objects.all())
+    popularity.rebuild()
+    feed.rebuild()
+    if stdout:
+        stdout.write(f'Создано: {recipes} рецептов, '
+                     f'{users_total} пользователей')
+    return user_ids
+
+
+def get_endpoints():
+    """Эндпоинты роутера api/urls.py с комбинациями RecipeFilter"""
+    user = User.objects.filter(
+        username__startswith=BENCH_PREFIX
+    ).order_by('id').first()
+    if user is None:
+        return None, []
+    recipe = Recipe.objects.filter(author=user).order_by('id').first()
+    tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+    tag_params = '&'.join(f'tags={slug}' for slug in tags[:2])
+    endpoints = [
+        ('recipes-list', '/api/recipes/'),
+        ('recipes-list-limit', '/api/recipes/?limit=50'),
+        ('recipes-list-page', '/api/recipes/?page=20'),
+        ('recipes-list-tag', f'/api/recipes/?tags={tags[0]}'),
+        ('recipes-list-tags', f'/api/recipes/?{tag_params}'),
+        ('recipes-list-tags-all',
+         f'/api/recipes/?{tag_params}&tags_mode=all'),
+        ('recipes-list-author', f'/api/recipes/?author={user.id}'),
+        ('recipes-list-favorited', '/api/recipes/?is_favorited=1'),
+        ('recipes-list-cart', '/api/recipes/?is_in_shopping_cart=1'),
+        ('recipes-list-combined',
+         f'/api/recipes/?{tag_params}&author={user.id}&is_favorited=1'),
+        ('recipes-list-popular', '/api/recipes/?ordering=popular'),
+        ('recipes-search',
+         '/api/recipes/?search=%D1%80%D0%B5%D1%86%D0%B5%D0%BF%D1%82'),
+        ('recipes-feed', '/api/recipes/feed/'),
+        ('recipes-detail', f'/api/recipes/{recipe.id}/'),
+        ('recipes-download-shopping-cart',
+         '/api/recipes/download_shopping_cart/'),
+        ('subscriptions-list', '/api/users/subscriptions/'),
+        ('subscriptions-list-recipes-limit',
+         '/api/users/subscriptions/?recipes_limit=3'),
+        ('ingredients-list', '/api/ingredients/'),
+        ('ingredients-autocomplete', '/api/ingredients/?name=%D0%B0'),
+        ('tags-list', '/api/tags/'),
+        ('users-list', '/api/users/'),
+        ('users-detail', f'/api/users/{user.id}/'),
+        ('users-me', '/api/users/me/'),
+    ]
+    return user, endpoints
+
+
+def _image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), '#E26C2D').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def get_write_endpoints(user):
+    """Запросы на запись от имени user: (имя, метод, путь, тело).
+    Они меняют данные, поэтому выполняются в транзакции с откатом"""
+    own = list(Recipe.objects.filter(author=user).order_by('id').values_list(
+        'id', flat=True
+    )[:2])
+    others = list(Recipe.objects.exclude(author=user).exclude(
+        favorites__user=user
+    ).exclude(carts__user=user).order_by('id').values_list(
+        'id', flat=True
+    )[:4])
+    author = User.objects.filter(username__startswith=BENCH_PREFIX).exclude(
+        id=user.id
+    ).exclude(following__user=user).order_by('id').first()
+    recipe = {
+        'name': 'Новый рецепт',
+        'text': 'Описание нового рецепта',
+        'cooking_time': 30,
+        'tags': list(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        )[:2]),
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 100}
+            for ingredient_id in Ingredient.objects.order_by(
+                'id'
+            ).values_list('id', flat=True)[:3]
+        ],
+    }
+    recipe_path = f'/api/recipes/{others[0]}'
+    return [
+        ('recipes-create', 'post', '/api/recipes/',
+         dict(recipe, image=_image_data())),
+        ('recipes-update', 'patch', f'/api/recipes/{own[0]}/',
+         dict(recipe, name='Измененный рецепт')),
+        ('recipes-favorite', 'post', f'{recipe_path}/favorite/', None),
+        ('recipes-favorite-delete', 'delete', f'{recipe_path}/favorite/',
+         None),
+        ('recipes-shopping-cart', 'post', f'{recipe_path}/shopping_cart/',
+         None),
+        ('recipes-shopping-cart-delete', 'delete',
+         f'{recipe_path}/shopping_cart/', None),
+        ('recipes-bulk-favorite', 'post', '/api/recipes/favorite/',
+         {'recipes': others[1:]}),
+        ('recipes-bulk-shopping-cart', 'post', '/api/recipes/shopping_cart/',
+         {'recipes': others[1:]}),
+        ('users-subscribe', 'post', f'/api/users/{author.id}/subscribe/',
+         None),
+        ('users-subscribe-delete', 'delete',
+         f'/api/users/{author.id}/subscribe/', None),
+        ('recipes-delete', 'delete', f'/api/recipes/{own[1]}/', None),
+    ]
+
+
+def _consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, url, repeat):
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        response = client.get(url)
+        _consume(response)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _consume(client.get(url))
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    _consume(client.get(url))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'queries': counter.count,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(repeat=20, only=None):
+    user, endpoints = get_endpoints()
+    if user is None:
+        return {}
+    token, _ = Token.objects.get_or_create(user=user)
+    client = Client(HTTP_HOST='localhost',
+                    HTTP_AUTHORIZATION=f'Token {token.key}')
+    # Пользователь по токену кэшируется: первый эндпоинт не должен
+    # платить за это запросом
+    client.get('/api/users/me/')
+    results = {}
+    for name, url in endpoints:
+        if only and name not in only:
+            continue
+        results[name] = dict(url=url, **measure(client, url, repeat))
+    return results
+
+
+def compare_with_budget(results, budget, tolerance):
+    """Список нарушений бюджета: запросы строго, время и память с допуском"""
+    violations = []
+    for name, limits in budget.items():
+        measured = results.get(name)
+        if measured is None:
+            continue
+        for metric, limit in limits.items():
+            allowed = limit if metric == 'queries' else limit * (
+                1 + tolerance
+            )
+            if measured.get(metric, 0) > allowed:
+                violations.append(
+                    f'{name}: {metric} {measured[metric]} > {limit}'
+                )
+    return violations
+
+
+def load_budget(path):
+    try:
+        with open(path, encoding='utf-8') as budget_file:
+            return json.load(budget_file)
+    except FileNotFoundError:
+        return {}
+
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(data, output, ensure_ascii=False, indent=2,
+                  sort_keys=True)
+        output.write('\n')
@@ -0,0 +1,41 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipe.versions import RECIPES, get_version
+
+
+class RecipeListCache:
+    """Кэш ответов списка рецептов для анонимных пользователей.
+
+    Ключ строится из нормализованных параметров фильтрации и пагинации
+    и версии рецептов, которую сигналы меняют при любом изменении
+    рецепта, его тегов или ингредиентов. Попадания и промахи считает
+    RequestMetricsMiddleware по заголовку X-Cache.
+    """
+    prefix = 'recipes-list'
+
+    def __init__(self, params):
+        self.params = frozenset(params)
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_LIST_CACHE_ALIAS]
+
+    def key(self, request):
+        params = sorted(
+            (name, tuple(sorted(set(request.query_params.getlist(name)))))
+            for name in request.query_params
+            if name in self.params
+        )
+        digest = hashlib.md5(
+            repr((request.get_host(), params)).encode('utf-8')
+        ).hexdigest()
+        return f'{self.prefix}:{get_version(RECIPES)}:{digest}'
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        self.cache.set(key, data, settings.RECIPE_LIST_CACHE_TIMEOUT)
@@ -0,0 +1,50 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+
+from foodgram.caches import is_shared
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для чтения.
+
+    Вью оборачивает обработчик в conditional, а get_conditional_state
+    возвращает части состояния, от которых зависит ответ, и время
+    последнего изменения в секундах. Если клиент прислал
+    совпадающий If-None-Match или If-Modified-Since, отдается 304 без
+    запросов за данными и сериализации.
+
+    Состояние строится из версий в кэше. Версии в памяти процесса другие
+    воркеры не видят, и ETag одного воркера совпал бы с устаревшим
+    ответом другого, поэтому без общего кэша заголовки не отдаются.
+    """
+    vary_on_user = False
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        return None
+
+    def conditional(self, request, handler, *args, **kwargs):
+        state = None
+        if request.method in ('GET', 'HEAD') and is_shared():
+            state = self.get_conditional_state(request, **kwargs)
+        if state is None:
+            return handler(request, *args, **kwargs)
+        parts, modified = state
+        etag = quote_etag(
+            hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+        )
+        last_modified = int(modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if self.vary_on_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,47 @@
+import functools
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics, queries
+
+
+def close_unusable_connections():
+    """Закрывает постоянные соединения, которые оборвались между
+    запросами, чтобы запрос открыл новое, а не упал на первом SQL"""
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    close_unusable_connections()
+
+
+# execute_wrapper текущего HTTP-запроса: измерения и детектор
+REQUEST_WRAPPERS = (metrics.current, queries.current)
+
+
+def request_wrappers(execute, sql, params, many, context):
+    """Передает SQL обработчикам текущего HTTP-запроса.
+
+    Они хранятся в contextvars, поэтому запросы из потоков sync_to_async
+    под ASGI попадают к тому же запросу, что и при WSGI.
+    """
+    for current in REQUEST_WRAPPERS:
+        wrapper = current()
+        if wrapper is not None:
+            execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_request_wrappers(sender, connection, **kwargs):
+    if request_wrappers not in connection.execute_wrappers:
+        connection.execute_wrappers.append(request_wrappers)
@@ -0,0 +1,312 @@
+import csv
+import functools
+import io
+import struct
+import zlib
+
+LINE_TEMPLATE = '{name}: {amount} ({unit})'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+CHUNK_SIZE = 64 * 1024
+
+
+def export_text(rows):
+    for row in rows:
+        yield (LINE_TEMPLATE.format(**row) + '\n').encode('utf-8')
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(CSV_HEADER)
+    for row in rows:
+        writer.writerow((row['name'], row['amount'], row['unit']))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class TrueTypeFont:
+    """Метрики и таблица символов TrueType-шрифта для встраивания в PDF"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as font_file:
+            self.data = font_file.read()
+        num_tables = struct.unpack_from('>H', self.data, 4)[0]
+        self.tables = {}
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sIII', self.data, 12 + index * 16
+            )
+            self.tables[tag.decode('latin-1')] = offset
+        head = self.tables['head']
+        self.units_per_em = struct.unpack_from('>H', self.data, head + 18)[0]
+        self.bbox = [
+            self.scale(value)
+            for value in struct.unpack_from('>4h', self.data, head + 36)
+        ]
+        hhea = self.tables['hhea']
+        ascent, descent = struct.unpack_from('>2h', self.data, hhea + 4)
+        self.ascent = self.scale(ascent)
+        self.descent = self.scale(descent)
+        self.num_metrics = struct.unpack_from('>H', self.data, hhea + 34)[0]
+        self._segments = self._read_cmap()
+        self._glyphs = {}
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self):
+        cmap = self.tables['cmap']
+        count = struct.unpack_from('>H', self.data, cmap + 2)[0]
+        for index in range(count):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHI', self.data, cmap + 4 + index * 8
+            )
+            subtable = cmap + offset
+            if (platform, encoding) == (3, 1) and struct.unpack_from(
+                    '>H', self.data, subtable)[0] == 4:
+                return subtable
+        raise ValueError('В шрифте нет таблицы Unicode (format 4)')
+
+    def glyph(self, char):
+        code = ord(char)
+        if code not in self._glyphs:
+            self._glyphs[code] = self._lookup(code)
+        return self._glyphs[code]
+
+    def _lookup(self, code):
+        subtable = self._segments
+        seg_count = struct.unpack_from('>H', self.data, subtable + 6)[0] // 2
+        ends = subtable + 14
+        starts = ends + seg_count * 2 + 2
+        deltas = starts + seg_count * 2
+        range_offsets = deltas + seg_count * 2
+        for index in range(seg_count):
+            end = struct.unpack_from('>H', self.data, ends + index * 2)[0]
+            if end < code:
+                continue
+            start = struct.unpack_from('>H', self.data, starts + index * 2)[0]
+            if start > code:
+                return 0
+            delta = struct.unpack_from('>h', self.data, deltas + index * 2)[0]
+            position = range_offsets + index * 2
+            range_offset = struct.unpack_from('>H', self.data, position)[0]
+            if range_offset == 0:
+                return (code + delta) & 0xFFFF
+            glyph = struct.unpack_from(
+                '>H', self.data,
+                position + range_offset + (code - start) * 2
+            )[0]
+            return (glyph + delta) & 0xFFFF if glyph else 0
+        return 0
+
+    def advance(self, glyph):
+        hmtx = self.tables['hmtx']
+        index = min(glyph, self.num_metrics - 1)
+        return self.scale(
+            struct.unpack_from('>H', self.data, hmtx + index * 4)[0]
+        )
+
+    def width(self, text, size):
+        return sum(self.advance(self.glyph(char)) for char in text) * (
+            size / 1000
+        )
+
+
+class PDFWriter:
+    """Постраничная генерация PDF: каждая страница отдается сразу после
+    заполнения, шрифт и таблица ссылок дописываются в конце"""
+    PAGE_WIDTH = 595
+    PAGE_HEIGHT = 842
+    MARGIN = 50
+    FONT_SIZE = 11
+    TITLE_SIZE = 16
+    LEADING = 16
+
+    CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR = 1, 2, 3, 4, 5
+    FONT_FILE, FONT_LENGTH, TO_UNICODE, WIDTHS = 6, 7, 8, 9
+    FIRST_FREE = 10
+
+    def __init__(self, font):
+        self.font = font
+        self.offset = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_number = self.FIRST_FREE
+        self.used = {}
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.offsets[number] = self.offset
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        return self._emit(
+            f'{number} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n'
+        )
+
+    def _stream(self, number, content):
+        return self._object(
+            number,
+            f'<< /Length {len(content)} >>\nstream\n'.encode('latin-1')
+            + content + b'\nendstream'
+        )
+
+    def _allocate(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def _encode(self, text):
+        glyphs = []
+        for char in text:
+            glyph = self.font.glyph(char)
+            self.used.setdefault(glyph, char)
+            glyphs.append(f'{glyph:04X}')
+        return '<' + ''.join(glyphs) + '>'
+
+    def _wrap(self, text, width):
+        line = ''
+        for word in text.split(' '):
+            candidate = f'{line} {word}' if line else word
+            if line and self.font.width(candidate, self.FONT_SIZE) > width:
+                yield line
+                line = word
+            else:
+                line = candidate
+        yield line
+
+    def _page(self, lines):
+        commands = [f'BT /F1 {self.FONT_SIZE} Tf {self.LEADING} TL',
+                    f'{self.MARGIN} {self.PAGE_HEIGHT - self.MARGIN} Td']
+        for size, text in lines:
+            commands.append(f'/F1 {size} Tf {self._encode(text)} Tj T*')
+        commands.append('ET')
+        content = '\n'.join(commands).encode('latin-1')
+        content_number, page_number = self._allocate(), self._allocate()
+        self.pages.append(page_number)
+        return self._stream(content_number, content) + self._object(
+            page_number,
+            f'<< /Type /Page /Parent {self.PAGES} 0 R '
+            f'/MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 {self.FONT} 0 R >> >> '
+            f'/Contents {content_number} 0 R >>'
+        )
+
+    def render(self, title, lines):
+        yield self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self._object(
+            self.CATALOG,
+            f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'
+        )
+        per_page = (self.PAGE_HEIGHT - 2 * self.MARGIN) // self.LEADING
+        text_width = self.PAGE_WIDTH - 2 * self.MARGIN
+        page = [(self.TITLE_SIZE, title), (self.FONT_SIZE, '')]
+        for line in lines:
+            for part in self._wrap(line, text_width):
+                if len(page) >= per_page:
+                    yield self._page(page)
+                    page = []
+                page.append((self.FONT_SIZE, part))
+        yield self._page(page)
+        yield from self._fonts()
+        yield self._object(
+            self.PAGES,
+            f'<< /Type /Pages /Count {len(self.pages)} /Kids ['
+            + ' '.join(f'{number} 0 R' for number in self.pages) + '] >>'
+        )
+        yield self._trailer()
+
+    def _fonts(self):
+        font = self.font
+        yield self._object(
+            self.FONT,
+            f'<< /Type /Font /Subtype /Type0 /BaseFont /EmbeddedFont '
+            f'/Encoding /Identity-H /DescendantFonts [{self.CID_FONT} 0 R] '
+            f'/ToUnicode {self.TO_UNICODE} 0 R >>'
+        )
+        yield self._object(
+            self.CID_FONT,
+            f'<< /Type /Font /Subtype /CIDFontType2 '
+            f'/BaseFont /EmbeddedFont /CIDSystemInfo << /Registry (Adobe) '
+            f'/Ordering (Identity) /Supplement 0 >> '
+            f'/FontDescriptor {self.DESCRIPTOR} 0 R '
+            f'/W {self.WIDTHS} 0 R /CIDToGIDMap /Identity >>'
+        )
+        yield self._object(
+            self.DESCRIPTOR,
+            f'<< /Type /FontDescriptor /FontName /EmbeddedFont /Flags 32 '
+            f'/FontBBox [{" ".join(map(str, font.bbox))}] /ItalicAngle 0 '
+            f'/Ascent {font.ascent} /Descent {font.descent} '
+            f'/CapHeight {font.ascent} /StemV 80 '
+            f'/FontFile2 {self.FONT_FILE} 0 R >>'
+        )
+        widths = ' '.join(
+            f'{glyph} [{font.advance(glyph)}]' for glyph in sorted(self.used)
+        )
+        yield self._object(self.WIDTHS, f'[{widths}]')
+        mappings = '\n'.join(
+            f'<{glyph:04X}> <{ord(char):04X}>'
+            for glyph, char in sorted(self.used.items())
+            if ord(char) <= 0xFFFF
+        )
+        cmap = (
+            '/CIDInit /ProcSet findresource begin\n12 dict begin\n'
+            'begincmap\n/CIDSystemInfo << /Registry (Adobe) '
+            '/Ordering (UCS) /Supplement 0 >> def\n'
+            '/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+            '1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+            f'{len(self.used)} beginbfchar\n{mappings}\nendbfchar\n'
+            'endcmap\nCMapName currentdict /CMap defineresource pop\n'
+            'end\nend'
+        ).encode('latin-1')
+        yield self._stream(self.TO_UNICODE, cmap)
+        yield from self._font_file()
+
+    def _font_file(self):
+        compressor = zlib.compressobj()
+        self.offsets[self.FONT_FILE] = self.offset
+        yield self._emit(
+            f'{self.FONT_FILE} 0 obj\n<< /Length {self.FONT_LENGTH} 0 R '
+            f'/Length1 {len(self.font.data)} /Filter /FlateDecode >>\n'
+            f'stream\n'.encode('latin-1')
+        )
+        length = 0
+        for start in range(0, len(self.font.data), CHUNK_SIZE):
+            chunk = compressor.compress(
+                self.font.data[start:start + CHUNK_SIZE]
+            )
+            length += len(chunk)
+            yield self._emit(chunk)
+        chunk = compressor.flush()
+        length += len(chunk)
+        yield self._emit(chunk + b'\nendstream\nendobj\n')
+        yield self._object(self.FONT_LENGTH, str(length))
+
+    def _trailer(self):
+        size = self.next_number
+        xref_offset = self.offset
+        entries = ['xref', f'0 {size}', '0000000000 65535 f ']
+        for number in range(1, size):
+            entries.append(f'{self.offsets[number]:010d} 00000 n ')
+        entries.append(
+            f'trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\n'
+            f'startxref\n{xref_offset}\n%%EOF\n'
+        )
+        return self._emit('\n'.join(entries).encode('latin-1'))
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(path):
+    return TrueTypeFont(path)
+
+
+def export_pdf(rows, font_path, title='Список покупок'):
+    lines = (LINE_TEMPLATE.format(**row) for row in rows)
+    return PDFWriter(load_font(font_path)).render(title, lines)
@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+from recipe import images
+
+
+def absolute_url(request, url):
+    return request.build_absolute_uri(url) if request else url
+
+
+def rendition_urls(image_name, ready, storage, request=None):
+    return {
+        rendition: absolute_url(request, storage.url(name))
+        for rendition, name in images.rendition_names(image_name,
+                                                      ready).items()
+    }
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки рецепта"""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return rendition_urls(recipe.image.name, recipe.renditions_ready,
+                              recipe.image.storage,
+                              self.context.get('request'))
@@ -1,6 +1,8 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as filters
 
 from recipe.models import Ingredient, Recipe, Tag
+from recipe.search import search
 from users.models import User
 
 
@@ -17,8 +19,15 @@ class IngredientFilterContains(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
+    POPULAR = 'popular'
+    TAGS_ANY, TAGS_ALL = 'any', 'all'
+
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(), to_field_name='slug', method='filter_tag')
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_ANY, 'Любой из тегов'), (TAGS_ALL, 'Все теги')),
+        method='filter_tags_mode'
+    )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='is_in_shopping_cart',
@@ -28,13 +37,38 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_favorited',
         method='filter_is_favorited'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=((POPULAR, 'Популярные'),),
+        method='filter_ordering'
+    )
 
     def filter_tag(self, queryset, name, value):
-        if value:
-            tags = []
-            for x in value:
-                tags.append(x.slug)
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+        """EXISTS по таблице связей вместо JOIN и DISTINCT"""
+        if not value:
+            return queryset
+        if self.form.cleaned_data.get('tags_mode') != self.TAGS_ALL:
+            return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value
+            )))
+        mask = 0
+        for tag in value:
+            if tag.bit is None:
+                queryset = queryset.filter(Exists(
+                    Recipe.tags.through.objects.filter(
+                        recipe=OuterRef('pk'), tag=tag
+                    )
+                ))
+            else:
+                mask |= 1 << tag.bit
+        if mask:
+            queryset = queryset.alias(
+                masked_tags=F('tag_mask').bitand(mask)
+            ).filter(masked_tags=mask)
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Учитывается в filter_tag"""
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
@@ -53,6 +87,20 @@ class RecipeFilter(filters.FilterSet):
             )
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            queryset = search(queryset, value)
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        if value == self.POPULAR:
+            queryset = queryset.order_by(
+                F('popularity__score').desc(nulls_last=True),
+                '-pub_date', '-id'
+            )
+        return queryset
+
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_in_shopping_cart', 'is_favorited']
+        fields = ['tags', 'tags_mode', 'author', 'is_in_shopping_cart',
+                  'is_favorited', 'search', 'ordering']
@@ -0,0 +1,149 @@
+"""Генератор нагрузки на asyncio без сторонних зависимостей.
+
+Каждый запрос открывает новое соединение HTTP/1.1 (Connection: close),
+как клиент за балансировщиком без keep-alive. Медленные клиенты читают
+ответ маленькими порциями с паузами.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from .benchmark import percentile
+
+READ_SIZE = 64 * 1024
+SLOW_READ_SIZE = 1024
+
+
+class LoadError(Exception):
+    pass
+
+
+async def _read_headers(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise LoadError('Пустой ответ')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return status, headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_body(reader, headers, read_delay):
+    size = SLOW_READ_SIZE if read_delay else READ_SIZE
+    chunked = headers.get('transfer-encoding', '').lower() == 'chunked'
+    body = bytearray()
+    while True:
+        if chunked:
+            length = int((await reader.readline()).split(b';')[0], 16)
+            if not length:
+                await reader.readline()
+                return bytes(body)
+            body += await reader.readexactly(length)
+            await reader.readline()
+        else:
+            chunk = await reader.read(size)
+            if not chunk:
+                return bytes(body)
+            body += chunk
+        if read_delay:
+            await asyncio.sleep(read_delay)
+
+
+async def request(url, method='GET', headers=None, body=b'',
+                  read_delay=0.0, timeout=30.0):
+    """(статус, тело ответа) одного запроса"""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {parts.netloc}',
+             'Connection: close', f'Content-Length: {len(body)}']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or 80
+        )
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status, response_headers = await _read_headers(reader)
+            return status, await _read_body(reader, response_headers,
+                                            read_delay)
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+class Stats:
+    """Время ответа и ошибки по именам запросов"""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, name, elapsed, ok):
+        self.timings[name].append(elapsed * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        duration = (self.finished or time.perf_counter()) - self.started
+        result = {}
+        for name in sorted(self.timings):
+            timings = self.timings[name]
+            result[name] = {
+                'requests': len(timings),
+                'rps': round(len(timings) / duration, 1),
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / len(timings), 4),
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+            }
+        return result
+
+
+async def timed(stats, name, url, **kwargs):
+    """Выполняет запрос и записывает время; ошибки сети тоже считаются"""
+    started = time.perf_counter()
+    try:
+        status, body = await request(url, **kwargs)
+    except (OSError, asyncio.TimeoutError, LoadError, ValueError):
+        stats.add(name, time.perf_counter() - started, False)
+        return None, b''
+    stats.add(name, time.perf_counter() - started, status < 400)
+    return status, body
+
+
+async def run_urls(base_url, endpoints, concurrency, duration,
+                   headers=None, slow_clients=0, read_delay=0.05):
+    """Клиенты по кругу запрашивают endpoints [(имя, путь)] в течение
+    duration секунд; первые slow_clients из них читают медленно"""
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+
+    async def client(number):
+        delay = read_delay if number < slow_clients else 0.0
+        index = number
+        while time.perf_counter() < deadline:
+            name, path = endpoints[index % len(endpoints)]
+            index += 1
+            await timed(stats, name, base_url + path, headers=headers,
+                        read_delay=delay)
+
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    stats.stop()
+    return stats.summary()
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import (compare_with_budget, load_budget, run_benchmarks,
+                           write_json)
+
+DEFAULT_BUDGET = Path(__file__).resolve().parents[3] / 'benchmarks' / (
+    'budget.json'
+)
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет эндпоинты API: число запросов, p50/p99 и пик памяти. '
+            'Данные создаются командой seed_benchmark')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--report', default='bench_report.json')
+        parser.add_argument('--budget', default=str(DEFAULT_BUDGET))
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Допуск для времени и памяти')
+        parser.add_argument('--update-budget', action='store_true',
+                            help='Записать результаты как новый бюджет')
+        parser.add_argument('--only', nargs='*',
+                            help='Имена эндпоинтов для прогона')
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(options['repeat'], options['only'])
+        if not results:
+            raise CommandError('Нет данных: выполните seed_benchmark')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:40} {result["status"]} '
+                f'q={result["queries"]:<4} p50={result["p50_ms"]:.2f}ms '
+                f'p99={result["p99_ms"]:.2f}ms peak={result["peak_kb"]}KB'
+            )
+        write_json(options['report'], results)
+
+        if options['update_budget']:
+            write_json(options['budget'], {
+                name: {metric: result[metric]
+                       for metric in ('queries', 'p99_ms', 'peak_kb')}
+                for name, result in results.items()
+            })
+            self.stdout.write(f'Бюджет обновлен: {options["budget"]}')
+            return
+
+        violations = compare_with_budget(
+            results, load_budget(options['budget']), options['tolerance']
+        )
+        if violations:
+            raise CommandError(
+                'Превышен бюджет:\n' + '\n'.join(violations)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджет соблюден'))
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.benchmark import write_json
+from api.servers import bench_endpoints, measure_server
+
+# Короткие запросы, в которых установка соединения заметна больше всего
+LIGHT_ENDPOINTS = ('users-me', 'tags-list', 'recipes-detail')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает gunicorn с разными настройками соединений с базой: '
+            'новое соединение на запрос, постоянные соединения и пул. '
+            'Данные создаются командой seed_benchmark')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--pool-size', type=int, default=2)
+        parser.add_argument('--conn-max-age', type=int, default=60)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=15)
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--report', default='connections_report.json')
+
+    def profiles(self, options):
+        yield 'per-request', {'DB_CONN_MAX_AGE': '0'}
+        yield 'persistent', {
+            'DB_CONN_MAX_AGE': str(options['conn_max_age']),
+            'DB_CONN_HEALTH_CHECKS': 'True',
+        }
+        engine = settings.DATABASES['default']['ENGINE']
+        if engine.startswith('django.db.backends.postgresql') or (
+                engine == 'foodgram.backends.postgresql_pool'):
+            yield 'pool', {
+                'DB_ENGINE': 'django.db.backends.postgresql',
+                'DB_POOL_SIZE': str(options['pool_size']),
+                'DB_CONN_HEALTH_CHECKS': 'True',
+            }
+        else:
+            self.stdout.write('Пул доступен только для PostgreSQL, пропущен')
+
+    def handle(self, *args, **options):
+        endpoints, headers = bench_endpoints(LIGHT_ENDPOINTS)
+        arguments = ['--workers', str(options['workers']),
+                     '--worker-class', 'gthread',
+                     '--threads', str(options['threads']), 'foodgram.wsgi']
+        report = {}
+        baseline = None
+        for profile, env in self.profiles(options):
+            env.setdefault('DB_POOL_SIZE', '0')
+            result = measure_server(
+                arguments, env, endpoints, headers, options['concurrency'],
+                options['duration'], options['port']
+            )
+            report[profile] = dict(env=env, **result)
+            p50 = {name: stats['p50_ms']
+                   for name, stats in result['endpoints'].items()}
+            if baseline is None:
+                baseline = p50
+            self.stdout.write(f'{profile:12} rps={result["rps"]}')
+            for name, stats in result['endpoints'].items():
+                delta = stats['p50_ms'] - baseline.get(name, stats['p50_ms'])
+                self.stdout.write(
+                    f'  {name:16} p50={stats["p50_ms"]}ms '
+                    f'({delta:+.2f}ms) p99={stats["p99_ms"]}ms '
+                    f'errors={stats["errors"]}'
+                )
+        write_json(options['report'], report)
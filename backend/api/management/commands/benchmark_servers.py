@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from api.benchmark import write_json
+from api.servers import bench_endpoints, measure_server
+
+READ_ENDPOINTS = (
+    'recipes-list', 'recipes-list-tag', 'recipes-detail', 'tags-list',
+    'ingredients-list', 'ingredients-autocomplete',
+    'recipes-download-shopping-cart',
+)
+SERVERS = {
+    'sync': ['--worker-class', 'sync', 'foodgram.wsgi'],
+    'async': ['--worker-class', 'uvicorn.workers.UvicornWorker',
+              'foodgram.asgi:application'],
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает синхронный gunicorn и ASGI-воркеры uvicorn на '
+            'эндпоинтах чтения: пропускная способность, p50/p99 и пик '
+            'памяти. Данные создаются командой seed_benchmark')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-workers', type=int, default=4)
+        parser.add_argument('--async-workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--slow-clients', type=int, default=8,
+                            help='Сколько клиентов читают ответ медленно')
+        parser.add_argument('--duration', type=float, default=20)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--report', default='servers_report.json')
+
+    def handle(self, *args, **options):
+        endpoints, headers = bench_endpoints(READ_ENDPOINTS)
+        report = {}
+        for server, workers in (('sync', options['sync_workers']),
+                                ('async', options['async_workers'])):
+            result = measure_server(
+                ['--workers', str(workers), *SERVERS[server]],
+                {'ASYNC_READS': str(server == 'async')},
+                endpoints, headers, options['concurrency'],
+                options['duration'], options['port'],
+                slow_clients=options['slow_clients']
+            )
+            report[server] = dict(workers=workers, **result)
+            self.stdout.write(
+                f'{server:6} workers={workers} rps={result["rps"]} '
+                f'peak={result["peak_rss_mb"]}MB '
+                f'rps/100MB={result["rps_per_100mb"]}'
+            )
+            for name, stats in result['endpoints'].items():
+                self.stdout.write(
+                    f'  {name:34} rps={stats["rps"]:<7} '
+                    f'p50={stats["p50_ms"]}ms p99={stats["p99_ms"]}ms '
+                    f'errors={stats["errors"]}'
+                )
+        write_json(options['report'], report)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import metrics
+
+
+class Command(BaseCommand):
+    help = ('Попадания и промахи кэша ответов по маршрутам из метрик '
+            'воркеров в METRICS_DIR')
+
+    def handle(self, *args, **options):
+        if not settings.METRICS_DIR:
+            raise CommandError(
+                'Счетчики хранятся в памяти воркеров: задайте METRICS_DIR '
+                'или смотрите foodgram_cache_responses_total в /api/_metrics'
+            )
+        routes = metrics.load(settings.METRICS_DIR)
+        for route, data in sorted(routes.items()):
+            hits = data['cache'].get('hit', 0)
+            misses = data['cache'].get('miss', 0)
+            if not hits + misses:
+                continue
+            self.stdout.write(
+                f'{route}: hits={hits} misses={misses} '
+                f'hit_rate={hits / (hits + misses) * 100:.1f}%'
+            )
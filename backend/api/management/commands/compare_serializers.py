@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.readers import RecipeReader
+from api.serializers import RecipeReadlSerializer
+from recipe.models import Favorite, Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время RecipeReader и RecipeReadlSerializer на '
+            'одной странице рецептов. Совпадение ответов проверяет '
+            'api.tests.RecipeReaderTests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для флагов')
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or Favorite.objects.values_list(
+            'user_id', flat=True
+        ).first()
+        users = [AnonymousUser()]
+        if user_id is not None:
+            users.append(User.objects.get(pk=user_id))
+        renderer = JSONRenderer()
+        for user in users:
+            request = Request(APIRequestFactory().get(
+                '/api/recipes/', SERVER_NAME='localhost'
+            ))
+            request.user = user
+            queryset = Recipe.objects.with_user_flags(user)[:options['limit']]
+
+            def serializer_path():
+                return RecipeReadlSerializer(
+                    queryset.with_related(), many=True,
+                    context={'request': request}
+                ).data
+
+            def reader_path():
+                reader = RecipeReader(request)
+                return reader.serialize(reader.rows(queryset))
+
+            label = user.username if user.is_authenticated else 'anonymous'
+            timings = {}
+            for name, path in (('serializer', serializer_path),
+                               ('reader', reader_path)):
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    renderer.render(path())
+                timings[name] = (
+                    (time.perf_counter() - started) / options['repeat'] * 1000
+                )
+            self.stdout.write(
+                f'{label}: {queryset.count()} рецептов, '
+                f'serializer={timings["serializer"]:.2f}ms '
+                f'reader={timings["reader"]:.2f}ms '
+                f'x{timings["serializer"] / timings["reader"]:.1f}'
+            )
@@ -0,0 +1,76 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from api import queries
+from api.benchmark import get_endpoints, get_write_endpoints
+
+
+class Command(BaseCommand):
+    help = ('Ищет N+1 и дубликаты SQL-запросов на эндпоинтах бенчмарка, '
+            'включая запись, и печатает сводку по каждому. Запись '
+            'откатывается. Данные создаются командой seed_benchmark')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int,
+                            help='По умолчанию QUERY_REPEAT_THRESHOLD')
+        parser.add_argument('--only', nargs='*',
+                            help='Имена эндпоинтов для прогона')
+        parser.add_argument('--reads-only', action='store_true',
+                            help='Без запросов на запись')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться ошибкой, если есть находки')
+
+    def inspect(self, client, name, method, url, payload, threshold):
+        detector = queries.QueryDetector(threshold)
+        with queries.activate(detector):
+            if payload is None:
+                response = getattr(client, method)(url)
+            else:
+                response = getattr(client, method)(
+                    url, json.dumps(payload), content_type='application/json'
+                )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        problems = detector.problems()
+        status = (self.style.ERROR(f'{len(problems)} проблем')
+                  if problems else self.style.SUCCESS('ok'))
+        self.stdout.write(
+            f'{name:40} {response.status_code} q={detector.queries:<4} '
+            f'shapes={len(detector.shapes):<4} {status}'
+        )
+        if problems:
+            self.stdout.write(
+                queries.describe(name, problems).split('\n', 1)[1]
+            )
+        return len(problems)
+
+    def handle(self, *args, **options):
+        user, endpoints = get_endpoints()
+        if user is None:
+            raise CommandError('Нет данных: выполните seed_benchmark')
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_HOST='localhost',
+                        HTTP_AUTHORIZATION=f'Token {token.key}')
+        client.get('/api/users/me/')
+        steps = [(name, 'get', url, None) for name, url in endpoints]
+        writes = [] if options['reads_only'] else get_write_endpoints(user)
+        found = 0
+        # Middleware не проверяет запросы: сводку печатает команда.
+        # Загруженные картинки уходят во временный каталог
+        with override_settings(QUERY_DETECTOR='off'), (
+                tempfile.TemporaryDirectory()) as media, (
+                override_settings(MEDIA_ROOT=media)), transaction.atomic():
+            for name, method, url, payload in steps + writes:
+                if options['only'] and name not in options['only']:
+                    continue
+                found += self.inspect(client, name, method, url,
+                                      payload, options['threshold'])
+            transaction.set_rollback(True)
+        if found and options['fail']:
+            raise CommandError(f'Найдено проблем: {found}')
@@ -0,0 +1,78 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import BENCH_PASSWORD, BENCH_PREFIX, write_json
+from api.loadgen import request
+from api.scenarios import SCENARIOS, run_scenarios
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер сценариями пользователей: лента с '
+            'тегами, рецепты, избранное, корзина, список покупок, подписки. '
+            'Пропускная способность, p50/p95/p99 и ошибки по эндпоинтам. '
+            'Данные создаются командой seed_benchmark')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Адрес сервера')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Число одновременных пользователей')
+        parser.add_argument('--ramp', type=float, default=10,
+                            help='За сколько секунд стартуют все '
+                                 'пользователи')
+        parser.add_argument('--duration', type=float, default=60)
+        parser.add_argument('--think', type=float, default=0.5,
+                            help='Пауза между запросами пользователя, до '
+                                 'стольких секунд')
+        parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS,
+                            help='По умолчанию все с весами из SCENARIOS')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--report', default='loadtest_report.json')
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        # У каждого пользователя свой аккаунт: сценарии одного аккаунта
+        # в параллель мешали бы друг другу
+        accounts = list(User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').values_list('email', flat=True)[
+            :options['concurrency']
+        ])
+        if len(accounts) < options['concurrency']:
+            raise CommandError(
+                f'Аккаунтов бенчмарка {len(accounts)}, нужно '
+                f'{options["concurrency"]}: выполните seed_benchmark '
+                f'с большим --size или уменьшите --concurrency'
+            )
+        try:
+            asyncio.run(request(base_url + '/api/tags/', timeout=5))
+        except (OSError, asyncio.TimeoutError) as error:
+            raise CommandError(f'Сервер {base_url} недоступен: {error}')
+
+        result = asyncio.run(run_scenarios(
+            base_url, accounts, BENCH_PASSWORD, options['duration'],
+            ramp=options['ramp'], think=options['think'],
+            scenarios=options['scenarios'], seed=options['seed']
+        ))
+        endpoints = result['endpoints']
+        total = sum(stats['requests'] for stats in endpoints.values())
+        errors = sum(stats['errors'] for stats in endpoints.values())
+        self.stdout.write(
+            f'Всего: {total} запросов, '
+            f'{sum(stats["rps"] for stats in endpoints.values()):.1f} rps, '
+            f'ошибок {errors} ({errors / total if total else 0:.2%})'
+        )
+        for title, summary in (('Эндпоинты', endpoints),
+                               ('Сценарии', result['journeys'])):
+            self.stdout.write(title)
+            for name, stats in summary.items():
+                self.stdout.write(
+                    f'  {name:32} n={stats["requests"]:<6} '
+                    f'rps={stats["rps"]:<7} p50={stats["p50_ms"]}ms '
+                    f'p95={stats["p95_ms"]}ms p99={stats["p99_ms"]}ms '
+                    f'errors={stats["errors"]} '
+                    f'({stats["error_rate"]:.2%})'
+                )
+        write_json(options['report'], result)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.benchmark import SIZES, clear_dataset, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу детерминированными данными для бенчмарков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=SIZES, default='small')
+        parser.add_argument('--recipes', type=int,
+                            help='Число рецептов вместо --size')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true',
+                            help='Только удалить данные бенчмарков')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_dataset()
+            self.stdout.write('Данные бенчмарков удалены')
+            return
+        recipes = options['recipes'] or SIZES[options['size']]
+        seed_dataset(recipes, seed=options['seed'], stdout=self.stdout)
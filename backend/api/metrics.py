@@ -0,0 +1,236 @@
+"""Метрики запросов по маршрутам в текстовом формате Prometheus.
+
+Каждый воркер копит метрики в памяти. Если задан METRICS_DIR, воркер
+раз в METRICS_FLUSH_INTERVAL секунд сохраняет свои значения в файл
+<pid>.json, а эндпоинт складывает файлы всех воркеров. Попадания и
+промахи кэша ответов считаются по заголовку X-Cache.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+# Границы гистограммы длительности запроса, в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMPONENTS = ('db', 'view', 'serialize')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Время частей одного запроса, в секундах"""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = dict.fromkeys(COMPONENTS, 0.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.durations['db'] += time.perf_counter() - started
+
+    def server_timing(self, total):
+        parts = [f'db;dur={self.durations["db"] * 1000:.2f};'
+                 f'desc="{self.queries} queries"']
+        parts += [f'{name};dur={self.durations[name] * 1000:.2f}'
+                  for name in COMPONENTS[1:]]
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def current():
+    """Измерения текущего запроса или None"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(timings):
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(component):
+    """Добавляет время блока к части запроса, если запрос измеряется"""
+    timings = current()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[component] += time.perf_counter() - started
+
+
+def _new_route():
+    return {
+        'buckets': [0] * len(BUCKETS),
+        'count': 0,
+        'sum': 0.0,
+        'queries': 0,
+        'components': dict.fromkeys(COMPONENTS, 0.0),
+        'statuses': defaultdict(int),
+        'cache': defaultdict(int),
+    }
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(_new_route)
+        self._flushed = time.monotonic()
+
+    def observe(self, route, status, total, timings, cache=None):
+        with self._lock:
+            data = self._routes[route]
+            data['count'] += 1
+            data['sum'] += total
+            for index, bound in enumerate(BUCKETS):
+                if total <= bound:
+                    data['buckets'][index] += 1
+                    break
+            data['queries'] += timings.queries
+            for name, duration in timings.durations.items():
+                data['components'][name] += duration
+            data['statuses'][str(status)] += 1
+            if cache:
+                data['cache'][cache.lower()] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._routes))
+
+    def _maybe_flush(self):
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (
+                now - self._flushed < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self._flushed = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        path = Path(directory) / f'{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        temporary.replace(path)
+
+
+registry = Registry()
+
+
+def _merge(total, routes):
+    for route, data in routes.items():
+        merged = total[route]
+        merged['buckets'] = [
+            left + right for left, right in zip(merged['buckets'],
+                                                data['buckets'])
+        ]
+        for key in ('count', 'sum', 'queries'):
+            merged[key] += data[key]
+        for name, duration in data['components'].items():
+            merged['components'][name] += duration
+        for status, count in data['statuses'].items():
+            merged['statuses'][status] += count
+        for result, count in data.get('cache', {}).items():
+            merged['cache'][result] += count
+
+
+def load(directory):
+    """Сумма метрик из файлов воркеров"""
+    total = defaultdict(_new_route)
+    for path in Path(directory).glob('*.json'):
+        try:
+            routes = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        _merge(total, routes)
+    return total
+
+
+def collect():
+    """Метрики всех воркеров, если есть METRICS_DIR, иначе текущего"""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return registry.snapshot()
+    registry.flush(directory)
+    return load(directory)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render(routes):
+    lines = [
+        '# HELP foodgram_http_requests_total Число запросов',
+        '# TYPE foodgram_http_requests_total counter',
+    ]
+    for route, data in sorted(routes.items()):
+        for status, count in sorted(data['statuses'].items()):
+            lines.append(f'foodgram_http_requests_total{{route="'
+                         f'{_label(route)}",status="{status}"}} {count}')
+    lines += [
+        '# HELP foodgram_http_request_duration_seconds Время ответа',
+        '# TYPE foodgram_http_request_duration_seconds histogram',
+    ]
+    for route, data in sorted(routes.items()):
+        label = f'route="{_label(route)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, data['buckets']):
+            cumulative += count
+            lines.append(
+                f'foodgram_http_request_duration_seconds_bucket'
+                f'{{{label},le="{bound}"}} {cumulative}'
+            )
+        lines += [
+            f'foodgram_http_request_duration_seconds_bucket'
+            f'{{{label},le="+Inf"}} {data["count"]}',
+            f'foodgram_http_request_duration_seconds_sum{{{label}}} '
+            f'{data["sum"]:.6f}',
+            f'foodgram_http_request_duration_seconds_count{{{label}}} '
+            f'{data["count"]}',
+        ]
+    lines += [
+        '# HELP foodgram_db_queries_total Число SQL-запросов',
+        '# TYPE foodgram_db_queries_total counter',
+    ]
+    for route, data in sorted(routes.items()):
+        lines.append(f'foodgram_db_queries_total{{route="{_label(route)}"}} '
+                     f'{data["queries"]}')
+    lines += [
+        '# HELP foodgram_request_component_seconds_total Время частей '
+        'запроса: db, view, serialize',
+        '# TYPE foodgram_request_component_seconds_total counter',
+    ]
+    for route, data in sorted(routes.items()):
+        for name, duration in data['components'].items():
+            lines.append(
+                f'foodgram_request_component_seconds_total{{route="'
+                f'{_label(route)}",component="{name}"}} {duration:.6f}'
+            )
+    lines += [
+        '# HELP foodgram_cache_responses_total Ответы из кэша (hit) и '
+        'собранные заново (miss)',
+        '# TYPE foodgram_cache_responses_total counter',
+    ]
+    for route, data in sorted(routes.items()):
+        for result, count in sorted(data['cache'].items()):
+            lines.append(f'foodgram_cache_responses_total{{route="'
+                         f'{_label(route)}",result="{result}"}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, queries
+
+
+def route_name(request):
+    """Действие вьюсета (RecipeViewSet.list) или имя маршрута"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = match.func
+    actions = getattr(view, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view.cls.__name__}.{action}'
+    cls = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    if cls is not None:
+        return cls.__name__
+    return match.url_name or match.view_name or 'unnamed'
+
+
+class HybridMiddleware:
+    """Middleware для WSGI и ASGI: под ASGI цепочка остается асинхронной,
+    и Django не проводит каждый запрос через один синхронный поток"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """Запросы к базе, время SQL, представления и сериализации.
+
+    Отдает их в заголовке Server-Timing и копит по маршрутам для
+    /api/_metrics. view включает db; serialize - рендер ответа и блоки
+    metrics.span('serialize') внутри представления.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.REQUEST_METRICS:
+            return self.get_response(request)
+        started, timings = self.start(request)
+        with metrics.activate(timings):
+            response = self.get_response(request)
+        return self.finish(request, response, started, timings)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_METRICS:
+            return await self.get_response(request)
+        started, timings = self.start(request)
+        with metrics.activate(timings):
+            response = await self.get_response(request)
+        return self.finish(request, response, started, timings)
+
+    def start(self, request):
+        request._view_started = request._view_finished = None
+        return time.perf_counter(), metrics.RequestTimings()
+
+    def finish(self, request, response, started, timings):
+        finished = time.perf_counter()
+        if request._view_started is not None:
+            timings.durations['view'] = (
+                (request._view_finished or finished) - request._view_started
+            )
+        total = finished - started
+        response['Server-Timing'] = timings.server_timing(total)
+        metrics.registry.observe(route_name(request), response.status_code,
+                                 total, timings, response.get('X-Cache'))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request._view_finished = time.perf_counter()
+        timings = metrics.current()
+
+        def rendered(response):
+            timings.durations['serialize'] += (
+                time.perf_counter() - request._view_finished
+            )
+
+        if timings is not None:
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class QueryDetectorMiddleware(HybridMiddleware):
+    """Ищет N+1 и дубликаты запросов: пишет их в лог или, при
+    QUERY_DETECTOR=raise, превращает запрос в ошибку"""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if settings.QUERY_DETECTOR == 'off':
+            return self.get_response(request)
+        detector = queries.QueryDetector()
+        with queries.activate(detector):
+            response = self.get_response(request)
+        queries.report(route_name(request), detector)
+        return response
+
+    async def __acall__(self, request):
+        if settings.QUERY_DETECTOR == 'off':
+            return await self.get_response(request)
+        detector = queries.QueryDetector()
+        with queries.activate(detector):
+            response = await self.get_response(request)
+        queries.report(route_name(request), detector)
+        return response
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
@@ -8,5 +8,45 @@ class Pagination(PageNumberPagination):
         return Response(data)
 
 
+class LimitCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+
 class CustomLimitPagination(PageNumberPagination):
+    """Постраничная пагинация с переходом на курсорную по запросу.
+
+    Курсорный режим включается параметром ?paginate=cursor или
+    наличием ?cursor= и работает только для вью с cursor_ordering.
+    Запросы с ?page= всегда получают прежний ответ с count. Позиция
+    курсора - первое поле сортировки: рецепты с одинаковой датой он
+    добирает смещением, и при смене направления внутри такой группы
+    страницы сдвигаются.
+    """
     page_size_query_param = 'limit'
+    mode_query_param = 'paginate'
+    cursor_query_param = LimitCursorPagination.cursor_query_param
+    cursor = None
+
+    def use_cursor(self, request, view):
+        params = request.query_params
+        return (
+            getattr(view, 'cursor_ordering', None) is not None
+            and self.page_query_param not in params
+            and (params.get(self.mode_query_param) == 'cursor'
+                 or self.cursor_query_param in params)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.use_cursor(request, view):
+            self.cursor = LimitCursorPagination(view.cursor_ordering)
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,177 @@
+"""Поиск N+1 и повторяющихся SQL-запросов в пределах одного запроса.
+
+Запрос сводится к форме: строки и числа заменяются на ?, списки IN (...)
+схлопываются. Форма, встреченная больше QUERY_REPEAT_THRESHOLD раз, -
+признак N+1; одинаковый запрос с одинаковыми параметрами дважды между
+двумя записями в базу - дубликат. Для каждой находки запоминается
+источник: поле сериализатора и строка кода проекта, из которой пришел
+запрос.
+"""
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import re
+import sys
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('query_detector', default=None)
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+\b')
+_IN_LISTS = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+# Точки сохранения создает atomic(), к коду приложения они не относятся
+_SKIPPED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+# После записи тот же SELECT может вернуть другое: это не дубликат
+_WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+# Обертки запроса, которые не считаются его источником
+_WRAPPERS = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('queries.py', 'metrics.py', 'middleware.py',
+                 'async_views.py', 'connections.py')
+}
+
+Cause = namedtuple('Cause', 'field location')
+Problem = namedtuple('Problem', 'kind count sql cause')
+
+
+class RepeatedQueriesError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Форма запроса без литералов и длины списков IN"""
+    shape = _STRINGS.sub('?', sql)
+    shape = _NUMBERS.sub('?', shape)
+    shape = _IN_LISTS.sub('IN (...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def _cause():
+    """Ближайшие к запросу поле сериализатора и строка кода проекта"""
+    project = os.path.join(str(settings.BASE_DIR), '')
+    field = location = None
+    frame = sys._getframe(2)
+    while frame is not None and (field is None or location is None):
+        code = frame.f_code
+        filename = code.co_filename
+        if (field is None and code.co_name == 'to_representation'
+                and 'rest_framework' in filename):
+            bound = frame.f_locals.get('field')
+            if getattr(bound, 'parent', None) is not None:
+                field = f'{type(bound.parent).__name__}.{bound.field_name}'
+        if (location is None and filename.startswith(project)
+                and 'site-packages' not in filename
+                and filename not in _WRAPPERS):
+            location = (f'{os.path.relpath(filename, project)}:'
+                        f'{frame.f_lineno} в {code.co_name}')
+        frame = frame.f_back
+    return Cause(field, location)
+
+
+def _describe_cause(cause):
+    return ', '.join(part for part in cause if part) or 'источник не найден'
+
+
+class QueryDetector:
+    """execute_wrapper, считающий формы запросов одного HTTP-запроса"""
+
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = settings.QUERY_REPEAT_THRESHOLD
+        self.threshold = threshold
+        self.queries = 0
+        self.shapes = Counter()
+        self.causes = {}
+        # Чтения с момента последней записи и их источники
+        self.statements = Counter()
+        self.statement_causes = {}
+        # Дубликаты, найденные до прошлых записей: (sql, число, источник)
+        self.duplicates = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        keyword = sql.lstrip()[:20].upper()
+        if not keyword.startswith(_SKIPPED):
+            shape = fingerprint(sql)
+            self.shapes[shape] += 1
+            # Источник ищется один раз на форму: обход стека дорогой
+            if self.shapes[shape] == self.threshold + 1:
+                self.causes[shape] = _cause()
+            if keyword.startswith(_WRITES):
+                self._written()
+            else:
+                statement = (sql, repr(params))
+                self.statements[statement] += 1
+                if self.statements[statement] == 2:
+                    self.statement_causes[statement] = _cause()
+        return execute(sql, params, many, context)
+
+    def _written(self):
+        self.duplicates += [
+            (statement[0], count, self.statement_causes[statement])
+            for statement, count in self.statements.items() if count > 1
+        ]
+        self.statements.clear()
+        self.statement_causes.clear()
+
+    def problems(self):
+        found = [
+            Problem('N+1', count, shape, self.causes[shape])
+            for shape, count in self.shapes.items()
+            if count > self.threshold
+        ]
+        repeated = {problem.sql for problem in found}
+        duplicates = self.duplicates + [
+            (statement[0], count, self.statement_causes[statement])
+            for statement, count in self.statements.items() if count > 1
+        ]
+        for sql, count, cause in duplicates:
+            shape = fingerprint(sql)
+            if shape not in repeated:
+                found.append(Problem('дубликат', count, shape, cause))
+        return sorted(found, key=lambda problem: -problem.count)
+
+
+def current():
+    """Детектор текущего запроса или None"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(detector):
+    token = _current.set(detector)
+    try:
+        yield detector
+    finally:
+        _current.reset(token)
+
+
+def describe(route, problems):
+    lines = [f'Повторяющиеся запросы в {route}:']
+    for problem in problems:
+        lines.append(
+            f'  {problem.kind} x{problem.count}: '
+            f'{_describe_cause(problem.cause)}: {problem.sql[:300]}'
+        )
+    return '\n'.join(lines)
+
+
+def report(route, detector):
+    """Пишет находки в лог или, при QUERY_DETECTOR=raise, бросает
+    RepeatedQueriesError"""
+    problems = detector.problems()
+    if not problems:
+        return problems
+    message = describe(route, problems)
+    if settings.QUERY_DETECTOR == 'raise':
+        raise RepeatedQueriesError(message)
+    logger.warning(message)
+    return problems
@@ -0,0 +1,31 @@
+from rest_framework import renderers
+
+
+class ExportRenderer(renderers.BaseRenderer):
+    """Формат выгрузки списка покупок.
+
+    Сам список отдается через StreamingHttpResponse, рендерер
+    используется для выбора формата по ?format= и для сообщений об ошибках.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data).encode('utf-8')
+
+
+class PlainTextRenderer(ExportRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ExportRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
@@ -0,0 +1,163 @@
+"""Сценарии пользователей для нагрузочного прогона на asyncio.
+
+Виртуальный пользователь входит через djoser (auth/token/login) под
+своим аккаунтом бенчмарка и по кругу проходит сценарии: листает рецепты
+с фильтром по тегам, открывает их, добавляет в избранное и корзину,
+скачивает список покупок, подписывается на авторов. Все изменения
+сценарий откатывает сам, поэтому повторные прогоны идут на тех же данных.
+"""
+import asyncio
+import json
+import random
+import time
+
+from .loadgen import Stats, timed
+
+
+class VirtualUser:
+
+    def __init__(self, base_url, stats, rng, think):
+        self.base_url = base_url
+        self.stats = stats
+        self.rng = rng
+        self.think = think
+        self.token = None
+        self.errors = 0
+        self.id = None
+        self.tags = []
+
+    async def call(self, name, method, path, payload=None):
+        """(статус, JSON или None); после запроса - пауза до think секунд"""
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        body = b''
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(payload).encode()
+        status, content = await timed(self.stats, name, self.base_url + path,
+                                      method=method, headers=headers,
+                                      body=body)
+        if status is None or status >= 400:
+            self.errors += 1
+        if self.think:
+            await asyncio.sleep(self.rng.uniform(0, self.think))
+        try:
+            return status, json.loads(content)
+        except ValueError:
+            return status, None
+
+    async def login(self, email, password):
+        status, data = await self.call(
+            'auth-token-login', 'POST', '/api/auth/token/login/',
+            {'email': email, 'password': password}
+        )
+        if status != 200 or not data:
+            return False
+        self.token = data['auth_token']
+        _, me = await self.call('users-me', 'GET', '/api/users/me/')
+        _, tags = await self.call('tags-list', 'GET', '/api/tags/')
+        if not me or not isinstance(tags, list):
+            return False
+        self.id = me['id']
+        self.tags = [tag['slug'] for tag in tags]
+        return True
+
+    async def feed(self):
+        """Страница рецептов с фильтром по одному-двум тегам"""
+        params = [f'page={self.rng.randint(1, 5)}']
+        if self.tags:
+            params += [f'tags={slug}' for slug in self.rng.sample(
+                self.tags, self.rng.randint(1, min(2, len(self.tags)))
+            )]
+        status, data = await self.call('recipes-list-tags', 'GET',
+                                       '/api/recipes/?' + '&'.join(params))
+        # 404 за последней страницей и 429 приходят с телом {'detail': ...}
+        return data['results'] if status == 200 else []
+
+    async def open(self, recipe):
+        status, data = await self.call('recipes-detail', 'GET',
+                                       f'/api/recipes/{recipe["id"]}/')
+        return data if status == 200 else None
+
+
+async def browse(user):
+    recipes = await user.feed()
+    for recipe in user.rng.sample(recipes, min(3, len(recipes))):
+        await user.open(recipe)
+
+
+async def cook(user):
+    recipes = [
+        recipe for recipe in await user.feed()
+        if not recipe['is_favorited'] and not recipe['is_in_shopping_cart']
+    ]
+    if not recipes:
+        return
+    recipe = await user.open(user.rng.choice(recipes))
+    if not recipe:
+        return
+    path = f'/api/recipes/{recipe["id"]}'
+    await user.call('recipes-favorite-post', 'POST', f'{path}/favorite/')
+    await user.call('recipes-shopping-cart-post', 'POST',
+                    f'{path}/shopping_cart/')
+    await user.call('recipes-download-shopping-cart', 'GET',
+                    '/api/recipes/download_shopping_cart/')
+    await user.call('recipes-shopping-cart-delete', 'DELETE',
+                    f'{path}/shopping_cart/')
+    await user.call('recipes-favorite-delete', 'DELETE', f'{path}/favorite/')
+
+
+async def follow(user):
+    authors = [
+        recipe['author'] for recipe in await user.feed()
+        if not recipe['author']['is_subscribed']
+        and recipe['author']['id'] != user.id
+    ]
+    if not authors:
+        return
+    path = f'/api/users/{user.rng.choice(authors)["id"]}'
+    await user.call('users-detail', 'GET', f'{path}/')
+    await user.call('users-subscribe-post', 'POST', f'{path}/subscribe/')
+    await user.call('subscriptions-list', 'GET',
+                    '/api/users/subscriptions/?recipes_limit=3')
+    await user.call('users-subscribe-delete', 'DELETE', f'{path}/subscribe/')
+
+
+# Сценарий: (вес, функция)
+SCENARIOS = {
+    'browse': (6, browse),
+    'cook': (3, cook),
+    'follow': (1, follow),
+}
+
+
+async def run_scenarios(base_url, accounts, password, duration, ramp=0.0,
+                        think=0.0, scenarios=None, seed=42):
+    """Пользователи с аккаунтами accounts [email] проходят scenarios в
+    течение duration секунд; стартуют равномерно за первые ramp секунд.
+    Возвращает сводку по эндпоинтам и по сценариям"""
+    names = list(scenarios or SCENARIOS)
+    weights = [SCENARIOS[name][0] for name in names]
+    endpoints, journeys = Stats(), Stats()
+    deadline = time.perf_counter() + duration
+
+    async def session(number, email):
+        await asyncio.sleep(ramp * number / len(accounts))
+        rng = random.Random(seed + number)
+        user = VirtualUser(base_url, endpoints, rng, think)
+        if not await user.login(email, password):
+            return
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            errors = user.errors
+            await SCENARIOS[name][1](user)
+            journeys.add(name, time.perf_counter() - started,
+                         user.errors == errors)
+
+    await asyncio.gather(*(session(number, email)
+                           for number, email in enumerate(accounts)))
+    endpoints.stop()
+    journeys.stop()
+    return {'endpoints': endpoints.summary(), 'journeys': journeys.summary()}
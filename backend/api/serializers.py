@@ -1,16 +1,20 @@
 import base64
 
 import webcolors
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 
+from recipe import feed, images, shopping_list
 from recipe.models import (Ingredient,
                            Recipe,
                            RecipeIngredient,
                            Tag,
                            Favorite,
                            ShoppingCart)
+from recipe.signals import recipe_saved_after
 from users.serializers import UserSerializer
+from .fields import ImageRenditionsField
 
 
 class Hex2NameColor(serializers.Field):
@@ -30,11 +34,28 @@ class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
+            if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_UPLOAD_SIZE:
+                raise serializers.ValidationError(
+                    'Слишком большой файл изображения'
+                )
+            content = base64.b64decode(imgstr)
+        elif hasattr(data, 'read'):
+            content = data.read()
+        else:
+            return super().to_internal_value(data)
+        try:
+            data = images.prepare_upload(content)
+        except images.ImageError as error:
+            raise serializers.ValidationError(str(error))
+        return super().to_internal_value(data)
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
-        return super().to_internal_value(data)
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -109,6 +130,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -123,15 +145,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
 
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        feed.publish(recipe)
+        images.schedule_renditions(recipe.image.name)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'tags' in validated_data:
             tags = validated_data.pop('tags')
             instance.tags.set(tags)
 
         if 'ingredients' in validated_data:
-            instance.ingredients.clear()
             ingredients_data = validated_data.pop('ingredients')
             recipe_ingredients = [
                 RecipeIngredient(
@@ -140,10 +164,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                     amount=ingredient.get('amount'))
                 for ingredient in ingredients_data
             ]
+            old_amounts = shopping_list.recipe_amounts(instance)
+            # updated_at обновит сохранение рецепта в super().update()
+            with recipe_saved_after():
+                instance.ingredients.clear()
             RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            shopping_list.change_recipe(instance, old_amounts)
 
-        instance.save()
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            # Поле не сохраняется save(): его меняют только запросы UPDATE
+            Recipe.objects.filter(pk=instance.pk).update(
+                renditions_ready=False
+            )
+            instance.renditions_ready = False
+            images.schedule_renditions(instance.image.name)
+        return instance
 
     def to_representation(self, instance):
         self.fields.pop('ingredients')
@@ -151,7 +187,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
 
         representation['ingredients'] = RecipeIngredientReadSerializer(
-            RecipeIngredient.objects.filter(recipe=instance).all(), many=True
+            RecipeIngredient.objects.filter(
+                recipe=instance
+            ).select_related('ingredient'), many=True
         ).data
         return representation
 
@@ -171,33 +209,44 @@ class RecipeReadlSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     text = serializers.CharField(source='description')
+    images = ImageRenditionsField()
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
-        if user.is_authenticated:
-            return Favorite.objects.filter(
-                recipe=obj,
-                user=user
-            ).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return Favorite.objects.filter(
+            recipe=obj,
+            user=user
+        ).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
-        if user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                recipe=obj,
-                user=user
-            ).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return ShoppingCart.objects.filter(
+            recipe=obj,
+            user=user
+        ).exists()
 
     def get_ingredients(self, obj):
         return RecipeIngredientReadSerializer(
-            RecipeIngredient.objects.filter(recipe=obj).all(), many=True).data
+            obj.recipeingredient_set.all(), many=True).data
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.subscribed = instance.author_subscribed
+        return super().to_representation(instance)
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'images', 'text',
+            'cooking_time'
         )
         read_only_fields = ('author', )
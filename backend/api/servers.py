@@ -0,0 +1,111 @@
+"""Запуск gunicorn для нагрузочных прогонов и замер его памяти"""
+import asyncio
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from rest_framework.authtoken.models import Token
+
+from .benchmark import get_endpoints
+from .loadgen import request, run_urls
+
+
+def _children():
+    children = {}
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    return children
+
+
+def tree_rss(pid):
+    """RSS процесса и всех его потомков, в килобайтах"""
+    children = _children()
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            status = Path(f'/proc/{current}/status').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1])
+    return total
+
+
+def bench_endpoints(names):
+    """Эндпоинты бенчмарка с указанными именами и заголовок с токеном"""
+    if shutil.which('gunicorn') is None:
+        raise CommandError('Нужен gunicorn: pip install gunicorn uvicorn')
+    user, endpoints = get_endpoints()
+    if user is None:
+        raise CommandError('Нет данных: выполните seed_benchmark')
+    token, _ = Token.objects.get_or_create(user=user)
+    return ([(name, url) for name, url in endpoints if name in names],
+            {'Authorization': f'Token {token.key}'})
+
+
+async def _wait_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('Сервер завершился при запуске')
+        try:
+            await request(base_url + '/api/tags/', timeout=2)
+            return
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(0.2)
+    raise CommandError('Сервер не ответил за отведенное время')
+
+
+def measure_server(arguments, env, endpoints, headers, concurrency,
+                   duration, port, slow_clients=0):
+    """Запускает gunicorn с arguments и переменными env, нагружает
+    endpoints и возвращает сводку с пиком памяти"""
+    bind = f'127.0.0.1:{port}'
+    base_url = f'http://{bind}'
+    process = subprocess.Popen(
+        ['gunicorn', '--bind', bind, *arguments],
+        cwd=settings.BASE_DIR, env=dict(os.environ, **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    peak = 0
+
+    async def sample(done):
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, tree_rss(process.pid))
+            await asyncio.sleep(0.5)
+
+    async def load():
+        await _wait_ready(base_url, process)
+        done = asyncio.Event()
+        sampler = asyncio.ensure_future(sample(done))
+        summary = await run_urls(base_url, endpoints, concurrency, duration,
+                                 headers=headers, slow_clients=slow_clients)
+        done.set()
+        await sampler
+        return summary
+
+    try:
+        summary = asyncio.run(load())
+    finally:
+        process.terminate()
+        process.wait()
+    rps = sum(stats['rps'] for stats in summary.values())
+    peak_mb = peak / 1024
+    return {
+        'rps': round(rps, 1),
+        'peak_rss_mb': round(peak_mb, 1),
+        'rps_per_100mb': round(rps / peak_mb * 100, 1) if peak_mb else 0,
+        'endpoints': summary,
+    }
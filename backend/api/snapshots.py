@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from recipe.versions import get_version
+
+
+class Snapshot:
+    """Готовые JSON-ответы воркера для редко меняющихся данных.
+
+    Все записи сбрасываются, когда меняется версия в общем кэше;
+    число записей ограничено, вытесняются давно не запрошенные.
+    """
+    renderer = JSONRenderer()
+
+    def __init__(self, version_name, max_entries=1024):
+        self.version_name = version_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._state = (None, OrderedDict())
+
+    def _entries(self):
+        version = get_version(self.version_name)
+        with self._lock:
+            if self._state[0] != version:
+                self._state = (version, OrderedDict())
+            return self._state[1]
+
+    def get(self, key, build):
+        """Байты ответа по ключу; build вызывается при промахе и
+        возвращает данные или None, если ответ кэшировать нельзя"""
+        entries = self._entries()
+        with self._lock:
+            content = entries.get(key)
+            if content is not None:
+                entries.move_to_end(key)
+                return content
+        data = build()
+        if data is None:
+            return None
+        content = self.renderer.render(data)
+        with self._lock:
+            entries[key] = content
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return content
+
+    def response(self, content):
+        return HttpResponse(
+            content, content_type=self.renderer.media_type
+        )
+
+
+class SnapshotMixin:
+    """Отдает list и retrieve из Snapshot для JSON-запросов"""
+    snapshot = None
+
+    def snapshot_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        response = None
+
+        def build():
+            nonlocal response
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return None
+            return response.data
+
+        key = (self.action, tuple(sorted(kwargs.items())),
+               tuple(sorted(request.query_params.lists())))
+        content = self.snapshot.get(key, build)
+        if content is None:
+            return response
+        return self.snapshot.response(content)
@@ -0,0 +1,981 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.benchmark import BENCH_PREFIX, get_write_endpoints, seed_dataset
+from api.readers import RecipeReader
+from api.serializers import RecipeReadlSerializer
+from recipe import bulk, counters, search, shopping_list
+from recipe.models import (Favorite, Follow, Ingredient, PopularityEvent,
+                           Recipe, RecipeIngredient, ShoppingCart,
+                           ShoppingListItem, Tag)
+from users import authentication
+from users.models import User
+
+
+def use_shared_cache(test):
+    """Кэш в файлах вместо LocMemCache до конца теста: is_shared()
+    считает его общим для воркеров"""
+    location = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, location, ignore_errors=True)
+    shared = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': location,
+    }})
+    shared.enable()
+    test.addCleanup(shared.disable)
+
+
+class QueryCountTests(TestCase):
+    """Число SQL-запросов эндпоинта не зависит от размера страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(60)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+        cls.recipe = Recipe.objects.filter(author=cls.user).first()
+
+    def setUp(self):
+        # Ответы и версии не должны переживать тест
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list(self):
+        for limit in (5, 30):
+            with self.subTest(limit=limit):
+                response = self.get(f'/api/recipes/?limit={limit}', 4)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        for limit in (5, 30):
+            with self.subTest(limit=limit):
+                self.get(f'/api/recipes/?limit={limit}', 4)
+
+    def test_recipe_detail(self):
+        self.get(f'/api/recipes/{self.recipe.id}/', 3)
+
+    def test_subscriptions(self):
+        for limit, recipes_limit in ((1, 1), (4, 3)):
+            with self.subTest(limit=limit, recipes_limit=recipes_limit):
+                response = self.get(
+                    f'/api/users/subscriptions/?limit={limit}'
+                    f'&recipes_limit={recipes_limit}', 3
+                )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_download_shopping_cart(self):
+        self.get('/api/recipes/download_shopping_cart/', 2)
+        in_cart = ShoppingCart.objects.filter(
+            user=self.user
+        ).values_list('recipe_id', flat=True)
+        bulk.add(self.user, ShoppingCart, list(
+            Recipe.objects.exclude(pk__in=in_cart).values_list(
+                'pk', flat=True
+            )[:20]
+        ))
+        self.get('/api/recipes/download_shopping_cart/', 2)
+
+
+class RecipeReaderTests(TestCase):
+    """RecipeReader отдает те же байты, что RecipeReadlSerializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+        # Оба вида ссылок на размеры картинки
+        Recipe.objects.filter(pk__in=Recipe.objects.order_by('id').values(
+            'pk'
+        )[:20]).update(renditions_ready=True)
+
+    def assertSameOutput(self, user):
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/', SERVER_NAME='localhost'
+        ))
+        request.user = user
+        queryset = Recipe.objects.with_user_flags(user)
+        expected = RecipeReadlSerializer(
+            queryset.with_related(), many=True, context={'request': request}
+        ).data
+        reader = RecipeReader(request)
+        actual = reader.serialize(reader.rows(queryset))
+        renderer = JSONRenderer()
+        self.assertEqual(len(actual), Recipe.objects.count())
+        self.assertEqual(
+            [renderer.render(item) for item in actual],
+            [renderer.render(item) for item in expected]
+        )
+
+    def test_anonymous(self):
+        self.assertSameOutput(AnonymousUser())
+
+    def test_authenticated(self):
+        # Флаги должны встречаться в обоих значениях
+        flags = Recipe.objects.with_user_flags(self.user).values_list(
+            'is_favorited', 'is_in_shopping_cart', 'author_subscribed'
+        )
+        for values in zip(*flags):
+            self.assertEqual(set(values), {True, False})
+        self.assertSameOutput(self.user)
+
+
+class FeedTests(TestCase):
+    """Лента отдает все рецепты авторов, а не только FEED_BACKFILL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.prolific, cls.author = (
+            User.objects.create(username=name, email=f'{name}@example.com')
+            for name in ('reader', 'prolific', 'author')
+        )
+        start = timezone.now() - timedelta(days=1)
+        # Старые рецепты второго автора перемежаются с рецептами
+        # первого, не попавшими в FEED_BACKFILL
+        for number in range(70):
+            cls.create_recipe(cls.prolific,
+                              start + timedelta(minutes=2 * number))
+        for number in range(5):
+            cls.create_recipe(cls.author,
+                              start + timedelta(minutes=2 * number + 1))
+        counters.recount()
+
+    @staticmethod
+    def create_recipe(author, pub_date):
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', description='Описание',
+            image='images/bench.png', cooking_time=10
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.reader)
+        for author in (self.prolific, self.author):
+            response = self.client.post(f'/api/users/{author.id}/subscribe/')
+            self.assertEqual(response.status_code, 201)
+
+    def walk(self):
+        ids = []
+        url = '/api/recipes/feed/?limit=20'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_older_recipes_after_backfill(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(len(expected), 75)
+        self.assertEqual(self.walk(), expected)
+
+
+class BulkTests(TestCase):
+    """Массовое добавление и удаление в избранном и корзине"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def free_recipes(self, model, count):
+        return list(Recipe.objects.exclude(
+            pk__in=model.objects.filter(user=self.user).values('recipe')
+        ).order_by('id').values_list('pk', flat=True)[:count])
+
+    def change(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['status']) for item in response.data]
+
+    def counts(self, recipe_ids, field):
+        return dict(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', field
+        ))
+
+    def weights(self, recipe_ids):
+        return PopularityEvent.objects.filter(
+            recipe__in=recipe_ids
+        ).aggregate(total=Sum('weight'))['total']
+
+    def assertOutcomes(self, model, url, field):
+        first, second = self.free_recipes(model, 2)
+        present = model.objects.filter(user=self.user).values_list(
+            'recipe_id', flat=True
+        ).first()
+        missing = Recipe.objects.order_by('-id').first().pk + 1
+        before = self.counts([first, second, present], field)
+
+        # Повтор id в одном запросе учитывается один раз
+        self.assertEqual(
+            self.change('post', url, [first, present, missing, first,
+                                      second]),
+            [(first, bulk.ADDED), (present, bulk.EXISTS),
+             (missing, bulk.NOT_FOUND), (second, bulk.ADDED)]
+        )
+        self.assertEqual(model.objects.filter(
+            user=self.user, recipe__in=[first, second]
+        ).count(), 2)
+        self.assertEqual(self.counts([first, second, present], field), {
+            first: before[first] + 1, second: before[second] + 1,
+            present: before[present],
+        })
+        self.assertEqual(PopularityEvent.objects.filter(
+            recipe__in=[first, second]
+        ).count(), 2)
+
+        self.assertEqual(
+            self.change('delete', url, [first, missing, first, second]),
+            [(first, bulk.REMOVED), (missing, bulk.ABSENT),
+             (second, bulk.REMOVED)]
+        )
+        self.assertFalse(model.objects.filter(
+            user=self.user, recipe__in=[first, second]
+        ).exists())
+        self.assertEqual(self.counts([first, second, present], field),
+                         before)
+        # Удаление снимает вклад добавления
+        self.assertEqual(self.weights([first, second]), 0)
+
+    def test_favorite(self):
+        self.assertOutcomes(Favorite, '/api/recipes/favorite/',
+                            'favorites_count')
+
+    def test_shopping_cart(self):
+        self.assertOutcomes(ShoppingCart, '/api/recipes/shopping_cart/',
+                            'carts_count')
+
+    def test_shopping_list(self):
+        recipe_ids = self.free_recipes(ShoppingCart, 3)
+        before = set(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient', 'amount'))
+        self.change('post', '/api/recipes/shopping_cart/', recipe_ids)
+        self.assertEqual(shopping_list.diff([self.user.id]), {})
+        self.assertNotEqual(set(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient', 'amount')), before)
+        self.change('delete', '/api/recipes/shopping_cart/', recipe_ids)
+        self.assertEqual(shopping_list.diff([self.user.id]), {})
+        self.assertEqual(set(ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient', 'amount')), before)
+
+    def test_limits(self):
+        for recipe_ids in ([], [0], list(range(1, 102))):
+            with self.subTest(size=len(recipe_ids)):
+                response = self.client.post(
+                    '/api/recipes/favorite/', {'recipes': recipe_ids},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_unique_cart(self):
+        recipe_id = ShoppingCart.objects.filter(
+            user=self.user
+        ).values_list('recipe_id', flat=True).first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ShoppingCart.objects.create(user=self.user, recipe_id=recipe_id)
+
+
+class ShoppingListTests(TestCase):
+    """ShoppingListItem совпадает с агрегацией по корзинам после любых
+    изменений корзин и рецептов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+        # Рецепт автора, который лежит в чужих корзинах
+        cls.recipe = Recipe.objects.filter(
+            author=cls.user, carts__isnull=False
+        ).exclude(carts__user=cls.user).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def assertConsistent(self):
+        self.assertEqual(shopping_list.diff(), {})
+
+    def test_cart(self):
+        path = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertConsistent()
+        self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assertConsistent()
+
+    def test_bulk(self):
+        recipe_ids = list(Recipe.objects.exclude(
+            carts__user=self.user
+        ).values_list('pk', flat=True)[:5])
+        for method in ('post', 'delete'):
+            response = getattr(self.client, method)(
+                '/api/recipes/shopping_cart/', {'recipes': recipe_ids},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertConsistent()
+
+    def test_ingredients_update(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', {
+                'name': 'Новый состав',
+                'text': 'Описание',
+                'cooking_time': 30,
+                'tags': list(Tag.objects.values_list('id', flat=True)[:1]),
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 7}
+                    for ingredient_id in Ingredient.objects.order_by(
+                        '-id'
+                    ).values_list('id', flat=True)[:2]
+                ],
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertConsistent()
+
+    def test_delete(self):
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertConsistent()
+
+    def test_delete_outside_api(self):
+        # Как из админки
+        Recipe.objects.filter(carts__isnull=False).first().delete()
+        self.assertConsistent()
+        # Каскадом вместе с автором
+        User.objects.filter(recipes__carts__isnull=False).exclude(
+            pk=self.user.pk
+        ).first().delete()
+        self.assertConsistent()
+
+
+class CountersTests(TestCase):
+    """Счетчики совпадают с пересчетом после изменений через API,
+    из админки и каскадом"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+
+    def assertCounted(self):
+        def snapshot():
+            return (
+                set(Recipe.objects.values_list(
+                    'pk', 'favorites_count', 'carts_count'
+                )),
+                set(User.objects.values_list(
+                    'pk', 'recipes_count', 'followers_count'
+                )),
+            )
+
+        stored = snapshot()
+        counters.recount()
+        self.assertEqual(stored, snapshot())
+
+    def test_api(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        for name, method, path, payload in get_write_endpoints(self.user):
+            # Создание сохранило бы картинку в MEDIA_ROOT
+            if name == 'recipes-create':
+                continue
+            with self.subTest(name=name):
+                response = getattr(client, method)(path, payload,
+                                                   format='json')
+                self.assertLess(response.status_code, 300)
+        self.assertCounted()
+
+    def test_outside_api(self):
+        other = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).exclude(pk=self.user.pk).exclude(
+            following__user=self.user
+        ).order_by('id').first()
+        recipe = Recipe.objects.exclude(favorites__user=self.user).exclude(
+            carts__user=self.user
+        ).exclude(author=self.user).first()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        Follow.objects.create(user=self.user, following=other)
+        Recipe.objects.create(
+            author=self.user, name='Рецепт', description='Описание',
+            image='images/bench.png', cooking_time=10
+        )
+        self.assertCounted()
+        # Передача рецепта другому автору
+        recipe.author = self.user
+        recipe.save()
+        self.assertCounted()
+        # Каскадом удаляются избранное и корзины рецепта
+        Recipe.objects.filter(favorites__isnull=False).first().delete()
+        self.assertCounted()
+        # и все строки пользователя
+        self.user.delete()
+        self.assertCounted()
+
+
+class TokenCacheTests(TestCase):
+    """Закэшированный токен перестает действовать вместе с настоящим"""
+
+    password = 'token-password'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='token', email='token@example.com',
+            password=cls.password
+        )
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        response = self.client.post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': self.password
+        })
+        self.token = response.data['auth_token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.me().status_code, 200)
+        self.assertTrue(self.cached())
+
+    def me(self):
+        return self.client.get('/api/users/me/')
+
+    def cached(self):
+        key = authentication._key(self.token)
+        return key in authentication._local or cache.get(key) is not None
+
+    def test_logout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.cached())
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_set_password(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'new_password': 'new-token-password',
+                'current_password': self.password,
+            })
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.cached())
+
+    def test_deactivated(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertFalse(self.cached())
+        self.assertEqual(self.me().status_code, 401)
+
+
+class SharedTokenCacheTests(TokenCacheTests):
+    """То же с общим кэшем, который видят все воркеры"""
+
+    def setUp(self):
+        use_shared_cache(self)
+        super().setUp()
+        self.assertIsNotNone(cache.get(authentication._key(self.token)))
+
+
+class TagMaskTests(TestCase):
+    """tags_mode=all по маске тегов и поддержка маски при изменении связей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.get(slug=slug)
+            for slug in ('breakfast', 'lunch', 'dinner')
+        )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def assertMasks(self):
+        expected = dict.fromkeys(Recipe.objects.values_list('pk', flat=True),
+                                 0)
+        for recipe_id, bit in Recipe.tags.through.objects.filter(
+                tag__bit__isnull=False).values_list('recipe_id', 'tag__bit'):
+            expected[recipe_id] |= 1 << bit
+        self.assertEqual(
+            dict(Recipe.objects.values_list('pk', 'tag_mask')), expected
+        )
+
+    def listed(self, query):
+        ids = []
+        url = f'/api/recipes/?limit=50&{query}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return sorted(ids)
+
+    def tagged(self, *tags):
+        queryset = Recipe.objects.all()
+        for tag in tags:
+            queryset = queryset.filter(tags=tag)
+        return sorted(queryset.values_list('pk', flat=True))
+
+    def test_filter(self):
+        self.assertMasks()
+        recipe = Recipe.objects.filter(tags=self.breakfast).first()
+        recipe.tags.add(self.lunch)
+        query = 'tags=breakfast&tags=lunch'
+        both = self.tagged(self.breakfast, self.lunch)
+        self.assertIn(recipe.pk, both)
+        self.assertEqual(self.listed(f'{query}&tags_mode=all'), both)
+        self.assertEqual(self.listed(query), sorted(set(
+            self.tagged(self.breakfast) + self.tagged(self.lunch)
+        )))
+
+    def test_filter_without_bit(self):
+        # Теги сверх TAG_MASK_BITS отбираются подзапросом
+        Tag.objects.filter(pk=self.lunch.pk).update(bit=None)
+        Recipe.objects.filter(tags=self.breakfast).first().tags.add(
+            self.lunch
+        )
+        self.assertEqual(
+            self.listed('tags=breakfast&tags=lunch&tags_mode=all'),
+            self.tagged(self.breakfast, self.lunch)
+        )
+
+    def test_recipe_side(self):
+        recipe = Recipe.objects.exclude(tags=self.dinner).first()
+        recipe.tags.add(self.dinner)
+        self.assertMasks()
+        recipe.tags.remove(self.dinner)
+        self.assertMasks()
+        recipe.tags.set([self.breakfast, self.lunch])
+        self.assertMasks()
+        recipe.tags.clear()
+        self.assertMasks()
+
+    def test_tag_side(self):
+        recipes = list(Recipe.objects.exclude(tags=self.dinner)[:3])
+        self.dinner.recipes.add(*recipes)
+        self.assertMasks()
+        self.dinner.recipes.remove(recipes[0])
+        self.assertMasks()
+        self.dinner.recipes.clear()
+        self.assertMasks()
+
+    def test_tag_deleted(self):
+        self.lunch.delete()
+        self.assertMasks()
+        # Освободившийся разряд достается новому тегу
+        tag = Tag.objects.create(name='Тестовый тег', color='#000000',
+                                 slug='test-tag')
+        self.assertEqual(tag.bit, self.lunch.bit)
+        self.assertMasks()
+
+
+class ConditionalGetTests(TestCase):
+    """ETag и Last-Modified отдаются только с общим кэшем"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+        cls.recipe = Recipe.objects.filter(author=cls.user).first()
+
+    def setUp(self):
+        use_shared_cache(self)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def assertNotModified(self, url, queries=0):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(queries):
+            repeated = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated.content, b'')
+        repeated = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(repeated.status_code, 304)
+        return etag
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recipe_list(self):
+        url = '/api/recipes/?limit=5'
+        # 304 без запросов к базе: версии лежат в кэше
+        etag = self.assertNotModified(url)
+        recipe = Recipe.objects.exclude(favorites__user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertModified(url, etag)
+
+    def test_recipe_detail(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.assertNotModified(url, queries=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {
+                'name': 'Новое название',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': list(Tag.objects.values_list('id', flat=True)[:1]),
+                'ingredients': [{
+                    'id': Ingredient.objects.values_list(
+                        'id', flat=True
+                    ).first(),
+                    'amount': 10,
+                }],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertModified(url, etag)
+
+    def test_tags_and_ingredients(self):
+        for url in ('/api/tags/', f'/api/tags/{Tag.objects.first().pk}/',
+                    '/api/ingredients/?name=bench'):
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_not_shared_cache(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }}):
+            for url in ('/api/recipes/', f'/api/recipes/{self.recipe.id}/',
+                        '/api/tags/', '/api/ingredients/'):
+                with self.subTest(url=url):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotIn('ETag', response)
+                    self.assertNotIn('Last-Modified', response)
+
+
+class ListCacheTests(TestCase):
+    """Кэш списка для анонимов и его сброс при изменении рецептов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def assertCache(self, url, result):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], result)
+        return response
+
+    def test_key(self):
+        self.assertCache('/api/recipes/?tags=breakfast&tags=lunch', 'MISS')
+        # Порядок и повторы значений и посторонние параметры ключ не меняют
+        for query in ('tags=lunch&tags=breakfast',
+                      'tags=lunch&tags=breakfast&tags=lunch',
+                      'tags=breakfast&tags=lunch&utm_source=mail'):
+            with self.subTest(query=query):
+                self.assertCache(f'/api/recipes/?{query}', 'HIT')
+        self.assertCache('/api/recipes/?tags=breakfast', 'MISS')
+        self.assertCache('/api/recipes/?tags=breakfast&limit=5', 'MISS')
+
+    def test_authenticated(self):
+        self.client.force_authenticate(User.objects.first())
+        self.assertNotIn('X-Cache', self.client.get('/api/recipes/'))
+
+    def rename_author(self):
+        author = User.objects.get(pk=self.recipe.author_id)
+        author.first_name = 'Автор'
+        author.save()
+
+    def test_invalidation(self):
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.filter(
+            recipeingredient__recipe=self.recipe
+        ).first()
+        changes = {
+            'recipe': self.recipe.save,
+            'recipe tags': lambda: self.recipe.tags.add(tag),
+            'recipe ingredients': lambda: RecipeIngredient.objects.filter(
+                recipe=self.recipe
+            ).first().save(),
+            'tag': tag.save,
+            'ingredient': ingredient.save,
+            'author': self.rename_author,
+            'recipe deleted': lambda: Recipe.objects.exclude(
+                pk=self.recipe.pk
+            ).first().delete(),
+        }
+        self.assertCache('/api/recipes/', 'MISS')
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                self.assertCache('/api/recipes/', 'HIT')
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                self.assertCache('/api/recipes/', 'MISS')
+
+    def test_unrelated_change(self):
+        self.assertCache('/api/recipes/', 'MISS')
+        # Вход автора не меняет полей, которые есть в ответе
+        author = User.objects.get(pk=self.recipe.author_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.last_login = timezone.now()
+            author.save()
+        self.assertCache('/api/recipes/', 'HIT')
+
+    def test_fresh_data(self):
+        self.assertCache('/api/recipes/', 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipe.pk).update(name='Новое')
+            Recipe.objects.get(pk=self.recipe.pk).save()
+        response = self.assertCache('/api/recipes/', 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'Новое')
+
+
+class CursorPaginationTests(TestCase):
+    """Курсор проходит те же рецепты в том же порядке, что и страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(40)
+        cls.user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link='next'):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            ids.extend(pages[-1])
+            url = response.data[link]
+        return ids, pages
+
+    def by_pages(self, url, limit):
+        ids = []
+        page = 1
+        while True:
+            response = self.client.get(f'{url}limit={limit}&page={page}')
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            page += 1
+
+    def assertSameWalk(self, url, limit, back=True):
+        expected = self.by_pages(url, limit)
+        ids, pages = self.walk(f'{url}paginate=cursor&limit={limit}')
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(set(ids)), len(ids))
+        if not back:
+            return
+        # Обратно по previous - те же страницы
+        last = self.client.get(f'{url}paginate=cursor&limit={limit}')
+        while last.data['next']:
+            last = self.client.get(last.data['next'])
+        back, _ = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(back, [
+            recipe_id for page in reversed(pages[:-1]) for recipe_id in page
+        ])
+
+    def test_recipes(self):
+        self.assertEqual(len(self.by_pages('/api/recipes/?', 7)),
+                         Recipe.objects.count())
+        self.assertSameWalk('/api/recipes/?', 7)
+
+    def test_recipes_same_dates(self):
+        # Одинаковые даты: порядок внутри них задает id, курсор добирает
+        # их смещением. Обратный проход через такую группу DRF сдвигает
+        Recipe.objects.filter(pk__in=Recipe.objects.order_by('id').values(
+            'pk'
+        )[5:15]).update(pub_date=timezone.now() - timedelta(days=1))
+        self.assertSameWalk('/api/recipes/?', 7, back=False)
+
+    def test_recipes_filtered(self):
+        self.assertSameWalk('/api/recipes/?tags=breakfast&tags=lunch&', 4)
+
+    def test_subscriptions(self):
+        self.assertSameWalk('/api/users/subscriptions/?recipes_limit=1&', 2)
+
+    def test_offset_only(self):
+        # Рейтинг и релевантность курсором не листаются
+        for query in ('ordering=popular', 'search=рецепт'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f'/api/recipes/?{query}&paginate=cursor&limit=5'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('count', response.data)
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск: FTS5 на SQLite, tsvector на PostgreSQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cook',
+                                       email='cook@example.com')
+        cls.borscht, cls.salad, cls.pie = (
+            Recipe.objects.create(
+                author=cls.user, name=name, description=description,
+                image='images/bench.png', cooking_time=10
+            )
+            for name, description in (
+                ('Борщ украинский', 'Свекла и капуста'),
+                ('Винегрет', 'Почти как борщ, только холодный'),
+                ('Пирог с капустой', 'Тесто и начинка'),
+            )
+        )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def found(self, text):
+        response = self.client.get('/api/recipes/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_rank(self):
+        # Совпадение в названии выше совпадения в описании
+        self.assertEqual(self.found('борщ'),
+                         [self.borscht.id, self.salad.id])
+
+    def test_word_forms(self):
+        self.assertEqual(set(self.found('капусту')),
+                         {self.borscht.id, self.pie.id})
+
+    def test_all_words(self):
+        self.assertEqual(self.found('пирог капуста'), [self.pie.id])
+        self.assertEqual(self.found('пирог свекла'), [])
+
+    def test_index_follows_changes(self):
+        Recipe.objects.filter(pk=self.pie.pk).update(name='Кулебяка')
+        self.assertEqual(self.found('пирог'), [])
+        self.assertEqual(self.found('кулебяка'), [self.pie.id])
+        self.borscht.delete()
+        self.assertEqual(self.found('борщ'), [self.salad.id])
+
+    def test_bulk_created(self):
+        Recipe.objects.bulk_create([Recipe(
+            author=self.user, name='Окрошка', description='На квасе',
+            image='images/bench.png', cooking_time=5
+        )])
+        self.assertEqual(len(self.found('окрошка')), 1)
+
+    def test_no_words(self):
+        self.assertEqual(self.found('!!!'), [])
+        # Пустой запрос не фильтрует
+        self.assertEqual(len(self.found('  ')), 3)
+
+
+class CartDuplicatesMigrationTests(TransactionTestCase):
+    """Миграция уникальности корзины убирает дубли и их вклад"""
+
+    before = [('recipe', '0018_recipe_updated_at')]
+    after = [('recipe', '0019_unique_cart_user_recipe')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        # SQLite пересоздал таблицу рецептов вместе с триггерами поиска
+        search.install(connection)
+
+    def test_duplicates_removed(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('users', 'User')
+        Ingredient = apps.get_model('recipe', 'Ingredient')
+        Recipe = apps.get_model('recipe', 'Recipe')
+        RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+        ShoppingCart = apps.get_model('recipe', 'ShoppingCart')
+        ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+        user = User.objects.create(username='cart', email='cart@example.com')
+        ingredient = Ingredient.objects.create(name='Мука',
+                                               measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=user, name='Рецепт', description='Описание',
+            image='images/bench.png', cooking_time=10, carts_count=3
+        )
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                                        amount=100)
+        # Три одинаковые строки корзины, каждая добавила ингредиенты
+        for _ in range(3):
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingListItem.objects.create(user=user, ingredient=ingredient,
+                                        amount=300)
+
+        self.migrate(self.after)
+        self.assertEqual(ShoppingCart.objects.filter(
+            user_id=user.id, recipe_id=recipe.id
+        ).count(), 1)
+        self.assertEqual(ShoppingListItem.objects.get(
+            user_id=user.id
+        ).amount, 100)
+        self.assertEqual(Recipe.objects.values_list(
+            'carts_count', flat=True
+        ).get(pk=recipe.id), 1)
@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from users.views import (SetPasswordViewSet, SubscriptionListViewSet,
                          UserViewSet)
-from .views import IngredientViewSet, RecipeViewSet, TagsViewSet
+from .async_views import async_view
+from .views import (IngredientViewSet, RecipeViewSet, TagsViewSet,
+                    metrics_view)
 
 router = DefaultRouter()
 
@@ -21,6 +24,34 @@ router.register(r'users', UserViewSet, basename='users')
 app_name = 'api'
 
 urlpatterns = [
+    path('_metrics', metrics_view, name='metrics'),
+]
+
+if settings.ASYNC_READS:
+    # Те же вьюсеты, что и в роутере; остальные маршруты остаются за ним
+    list_actions = {'get': 'list', 'post': 'create'}
+    detail_actions = {'get': 'retrieve', 'put': 'update',
+                      'patch': 'partial_update', 'delete': 'destroy'}
+    for prefix, viewset in (('recipes', RecipeViewSet),
+                            ('tags', TagsViewSet),
+                            ('ingredients', IngredientViewSet)):
+        if viewset is RecipeViewSet:
+            urlpatterns.append(path(
+                'recipes/download_shopping_cart/',
+                async_view(viewset, {'get': 'download_shopping_cart'},
+                           prefix, detail=False),
+                name='recipes-download-shopping-cart'
+            ))
+        urlpatterns += [
+            path(f'{prefix}/',
+                 async_view(viewset, list_actions, prefix, detail=False),
+                 name=f'{prefix}-list'),
+            path(f'{prefix}/<int:pk>/',
+                 async_view(viewset, detail_actions, prefix, detail=True),
+                 name=f'{prefix}-detail'),
+        ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
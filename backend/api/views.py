@@ -1,36 +1,160 @@
-from django.db.models import F, Sum
-from django.http import HttpResponse
+import hmac
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from recipe.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                           ShoppingCart, Tag)
+from recipe import bulk, feed
+from recipe.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                           ShoppingListItem, Tag)
+from recipe.versions import (INGREDIENTS, RECIPES, TAGS, get_version,
+                             timestamp, user_state)
 from users.serializers import RecipeShortSerializer
+from . import metrics
+from .autocomplete import ingredient_index, normalize
+from .caching import RecipeListCache
+from .conditional import ConditionalGetMixin
+from .exports import export_csv, export_pdf, export_text
 from .filters import IngredientFilterContains, RecipeFilter
-from .pagination import Pagination, CustomLimitPagination
+from .pagination import (CustomLimitPagination, LimitCursorPagination,
+                         Pagination)
+from .readers import RecipeReader
 from .permissions import IsAdminOrReadOnly, IsAuthenticatedAuthorOrAdmin
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from .serializers import (IngredientSerializer, RecipeCreateSerializer,
-                          RecipeReadlSerializer, TagSerializer)
+                          RecipeIdsSerializer, RecipeReadlSerializer,
+                          TagSerializer)
+from .snapshots import Snapshot, SnapshotMixin
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = CustomLimitPagination
     permission_classes = [AllowAny]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    date_ordering = ('-pub_date', '-id')
+    vary_on_user = True
+    list_cache = RecipeListCache(
+        list(RecipeFilter.base_filters) + [
+            CustomLimitPagination.page_query_param,
+            CustomLimitPagination.page_size_query_param,
+            CustomLimitPagination.mode_query_param,
+            CustomLimitPagination.cursor_query_param,
+        ]
+    )
+
+    @property
+    def cursor_ordering(self):
+        """Курсор работает только для сортировки по дате"""
+        params = self.request.query_params
+        if (params.get('ordering') == RecipeFilter.POPULAR
+                or params.get('search', '').strip()):
+            return None
+        return self.date_ordering
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'feed':
+            queryset = feed.feed_queryset(self.request.user,
+                                          **self.feed_window())
+        if self.action in ('list', 'retrieve', 'feed'):
+            queryset = queryset.with_user_flags(self.request.user)
+            if not self.fast_read:
+                queryset = queryset.with_related()
+        return queryset
+
+    @property
+    def fast_read(self):
+        """Чтение через RecipeReader вместо RecipeReadlSerializer"""
+        return settings.RECIPE_FAST_READ
 
     def get_serializer_class(self):
         if self.action == 'shopping_cart' or self.action == 'favorite':
             return RecipeShortSerializer
-        elif self.action == 'retrieve' or self.action == 'list':
+        elif self.action in ('bulk_shopping_cart', 'bulk_favorite'):
+            return RecipeIdsSerializer
+        elif self.action in ('retrieve', 'list', 'feed'):
             return RecipeReadlSerializer
         return RecipeCreateSerializer
 
+    def get_conditional_state(self, request, pk=None):
+        """Список зависит от версии рецептов, рецепт - от updated_at;
+        флаги избранного, корзины и подписки - от версии пользователя"""
+        user = request.user
+        versions = [get_version(user_state(user.id))
+                    if user.is_authenticated else 0]
+        parts = [request.get_host(), self.action, user.id]
+        if self.action == 'retrieve':
+            try:
+                updated_at = Recipe.objects.filter(pk=pk).values_list(
+                    'updated_at', flat=True
+                ).first()
+            except ValueError:
+                return None
+            if updated_at is None:
+                return None
+            versions += [get_version(TAGS), get_version(INGREDIENTS)]
+            parts += [pk, updated_at.isoformat()]
+            modified = updated_at.timestamp()
+        else:
+            versions.append(get_version(RECIPES))
+            parts.append(sorted(request.query_params.lists()))
+            modified = 0
+        parts += versions
+        return parts, max(modified, *map(timestamp, versions))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.cached_list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.read_one, *args, **kwargs)
+
+    def read_one(self, request, *args, **kwargs):
+        if not self.fast_read:
+            return super().retrieve(request, *args, **kwargs)
+        reader = RecipeReader(request)
+        try:
+            rows = reader.rows(self.get_queryset().filter(pk=kwargs['pk']))
+            data = reader.serialize(rows)
+        except ValueError:
+            data = None
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    def read_list(self, request, *args, **kwargs):
+        if not self.fast_read:
+            return super().list(request, *args, **kwargs)
+        reader = RecipeReader(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(reader.rows(queryset))
+        return self.get_paginated_response(reader.serialize(page))
+
+    def cached_list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return self.read_list(request, *args, **kwargs)
+        key = self.list_cache.key(request)
+        data = self.list_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = self.read_list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.list_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -39,6 +163,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'download_shopping_cart',
                 'shopping_cart',
                 'favorite',
+                'bulk_shopping_cart',
+                'bulk_favorite',
+                'feed',
                 'create',
         ):
             return [IsAuthenticated()]
@@ -47,84 +174,144 @@ class RecipeViewSet(viewsets.ModelViewSet):
         elif self.action in ('list', 'retrieve'):
             return super().get_permissions()
 
+    @action(detail=False, methods=['GET'])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми"""
+        return self.conditional(request, self.feed_page)
+
+    def feed_window(self):
+        """Граница и число рецептов, которые прочитает курсор страницы"""
+        paginator = LimitCursorPagination(self.date_ordering)
+        cursor = paginator.decode_cursor(self.request)
+        limit = (paginator.get_page_size(self.request) or 0) + 1
+        if cursor is None:
+            return {'limit': limit}
+        return {'limit': cursor.offset + limit, 'position': cursor.position,
+                'reverse': cursor.reverse}
+
+    def feed_page(self, request):
+        paginator = LimitCursorPagination(self.date_ordering)
+        queryset = self.get_queryset()
+        if self.fast_read:
+            reader = RecipeReader(request)
+            page = paginator.paginate_queryset(reader.rows(queryset),
+                                               request, self)
+            return paginator.get_paginated_response(reader.serialize(page))
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def destroy(self, request, pk):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk, author=user)
-        recipe.delete()
+        with transaction.atomic():
+            recipe.delete()
         return Response(
             {'detail': 'Ваш рецепт удален'},
             status=status.HTTP_204_NO_CONTENT
         )
 
-    @action(detail=False, methods=['GET'])
+    @action(
+        detail=False,
+        methods=['GET'],
+        renderer_classes=[
+            PlainTextRenderer, CSVRenderer, PDFRenderer, JSONRenderer
+        ]
+    )
     def download_shopping_cart(self, request):
         user = request.user
-        shopping_cart = RecipeIngredient.objects.filter(
-            recipe__carts__user=user).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
+        shopping_cart = ShoppingListItem.objects.filter(
+            user=user, amount__gt=0
+        ).values(
+            'amount',
             name=F('ingredient__name'),
             unit=F('ingredient__measurement_unit'),
-            amount=Sum('amount')
-        )
+        ).order_by('ingredient__name')
 
-        if not shopping_cart:
+        if not shopping_cart.exists():
             return Response(
                 {'detail': 'Корзина пуста'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        text = '\n'.join(
-            [f'{ingredient["name"]}:'
-             f' {ingredient["amount"]} ({ingredient["unit"]})'
-             for ingredient in shopping_cart]
+        export_format = request.accepted_renderer.format
+        rows = shopping_cart.iterator(
+            chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE
         )
+        if export_format == 'pdf':
+            if not os.path.exists(settings.SHOPPING_LIST_FONT):
+                return Response(
+                    {'errors': 'Выгрузка в PDF недоступна'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            content = export_pdf(rows, settings.SHOPPING_LIST_FONT)
+            content_type = PDFRenderer.media_type
+        elif export_format == 'csv':
+            content = export_csv(rows)
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            export_format = 'txt'
+            content = export_text(rows)
+            content_type = 'text/plain; charset=utf-8'
 
-        response = HttpResponse(text, content_type='txt/plain')
-        response['Content-Disposition'] = 'attachment;' \
-                                          ' filename="shopping_cart.pdf"'
-
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{export_format}"'
+        )
         return response
 
+    def bulk_change(self, request, model):
+        """Добавление или удаление списка рецептов за один запрос"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = bulk.add if request.method == 'POST' else bulk.remove
+        outcomes = change(request.user, model,
+                          serializer.validated_data['recipes'])
+        return Response(
+            [{'id': pk, 'status': outcome}
+             for pk, outcome in outcomes.items()],
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='shopping_cart')
+    def bulk_shopping_cart(self, request):
+        return self.bulk_change(request, ShoppingCart)
+
+    @action(detail=False, methods=['POST', 'DELETE'], url_path='favorite')
+    def bulk_favorite(self, request):
+        return self.bulk_change(request, Favorite)
+
     @action(detail=True, methods=['POST', 'DELETE'])
     def shopping_cart(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         user = request.user
 
+        # bulk блокирует пользователя: параллельные запросы не применят
+        # список покупок и счетчики дважды
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(
-                    recipe__carts__recipe=recipe,
-                    user=user
-            ).exists():
+            if bulk.add(user, ShoppingCart, [recipe.pk])[recipe.pk] != (
+                    bulk.ADDED):
                 return Response(
                     {'errors': 'Рецепт уже в вашем списке покупок'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            else:
-                ShoppingCart.objects.create(
-                    user=user, recipe=recipe
-                )
-                return Response(
-                    {'detail': 'Рецепт добавлен в список покупок'},
-                    status=status.HTTP_201_CREATED
-                )
+            return Response(
+                {'detail': 'Рецепт добавлен в список покупок'},
+                status=status.HTTP_201_CREATED
+            )
 
         elif request.method == 'DELETE':
-            try:
-                shopping_cart = ShoppingCart.objects.get(
-                    user=user, recipe=recipe
-                )
-                shopping_cart.delete()
-                return Response(
-                    {'detail': 'Рецепт удален из Вашего списка покупок'},
-                    status=status.HTTP_204_NO_CONTENT
-                )
-            except ShoppingCart.DoesNotExist:
+            if bulk.remove(user, ShoppingCart, [recipe.pk])[recipe.pk] != (
+                    bulk.REMOVED):
                 return Response(
                     {'errors': 'Рецепт не найден в Вашем списке покупок'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            return Response(
+                {'detail': 'Рецепт удален из Вашего списка покупок'},
+                status=status.HTTP_204_NO_CONTENT
+            )
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def favorite(self, request, pk):
@@ -132,49 +319,109 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = request.user
 
         if request.method == 'POST':
-            if Favorite.objects.filter(
-                    recipe__favorites__recipe=recipe,
-                    user=user
-            ).exists():
+            if bulk.add(user, Favorite, [recipe.pk])[recipe.pk] != (
+                    bulk.ADDED):
                 return Response(
                     {'errors': 'Рецепт уже в избранном'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            else:
-                Favorite.objects.create(
-                    user=user, recipe=recipe
-                )
-                return Response(
-                    {'detail': 'Рецепт добавлен в избранное'},
-                    status=status.HTTP_201_CREATED
-                )
+            return Response(
+                {'detail': 'Рецепт добавлен в избранное'},
+                status=status.HTTP_201_CREATED
+            )
 
         else:
-            try:
-                favorite = Favorite.objects.get(user=user, recipe=recipe)
-                favorite.delete()
-                return Response(
-                    {'message': 'Рецепт удален из избранного'},
-                    status=status.HTTP_204_NO_CONTENT
-                )
-            except Favorite.DoesNotExist:
+            if bulk.remove(user, Favorite, [recipe.pk])[recipe.pk] != (
+                    bulk.REMOVED):
                 return Response(
                     {'errors': 'Рецепта нет в Вашем избранном'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            return Response(
+                {'message': 'Рецепт удален из избранного'},
+                status=status.HTTP_204_NO_CONTENT
+            )
 
 
-class TagsViewSet(viewsets.ModelViewSet):
+class TagsViewSet(ConditionalGetMixin, SnapshotMixin,
+                  viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = Pagination
     permission_classes = [IsAdminOrReadOnly]
+    snapshot = Snapshot(TAGS)
+
+    def get_conditional_state(self, request, pk=None):
+        version = get_version(TAGS)
+        return (
+            (self.action, pk, sorted(request.query_params.lists()), version),
+            timestamp(version)
+        )
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.snapshot_response,
+                                super().list, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.snapshot_response,
+                                super().retrieve, *args, **kwargs)
+
+
+class IngredientViewSet(ConditionalGetMixin, SnapshotMixin,
+                        viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilterContains
     permission_classes = [IsAdminOrReadOnly]
+    snapshot = Snapshot(INGREDIENTS, max_entries=4096)
+
+    def get_conditional_state(self, request, pk=None):
+        version = get_version(INGREDIENTS)
+        return (
+            (self.action, pk, sorted(request.query_params.lists()), version),
+            timestamp(version)
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, self.search, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, self.snapshot_response,
+                                super().retrieve, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        """Весь список или срез по префиксу из снимка воркера"""
+        name = request.query_params.get('name')
+        if not name:
+            key, build = ('all',), ingredient_index.all
+        else:
+            try:
+                limit = min(int(request.query_params['limit']),
+                            settings.INGREDIENT_AUTOCOMPLETE_MAX_LIMIT)
+            except (KeyError, ValueError):
+                limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+            prefix, limit = normalize(name), max(limit, 1)
+            key = ('search', prefix, limit)
+
+            def build():
+                return ingredient_index.search(prefix, limit)
+        if request.accepted_renderer.format != 'json':
+            return Response(build())
+        return self.snapshot.response(self.snapshot.get(key, build))
+
+
+def metrics_view(request):
+    """Метрики запросов для Prometheus по заголовку Authorization:
+    Bearer <METRICS_TOKEN>; без токена в настройках эндпоинта нет"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
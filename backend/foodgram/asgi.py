@@ -0,0 +1,45 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Под ASGI чтение рецептов, тегов и ингредиентов идет через async-маршруты
+os.environ.setdefault('ASYNC_READS', 'True')
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """Отдает async_streaming_content ответа по мере готовности кусков:
+    Django 3.2 умеет только синхронные потоковые ответы"""
+
+    async def send_response(self, response, send):
+        chunks = getattr(response, 'async_streaming_content', None)
+        if chunks is None:
+            return await super().send_response(response, send)
+
+        async def send_chunks(message):
+            # Перед последним пустым сообщением тела
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body')):
+                try:
+                    async for chunk in chunks:
+                        await send({'type': 'http.response.body',
+                                    'body': chunk, 'more_body': True})
+                finally:
+                    await chunks.aclose()
+            await send(message)
+
+        await super().send_response(response, send_chunks)
+
+
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
@@ -0,0 +1,66 @@
+"""Пул соединений DB-API для потоков одного процесса"""
+import threading
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Не больше size соединений: поток, которому не хватило, ждет
+    timeout секунд. Соединения создает connect, перед выдачей из пула
+    проверяет check, при возврате приводит в исходное состояние reset"""
+
+    def __init__(self, size, timeout, check=None, reset=None):
+        self.size = size
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0
+
+    def acquire(self, connect):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'Нет свободного соединения за {self.timeout} с'
+            )
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    connection = connect()
+                    self.created += 1
+                    return connection
+                if self.check is None or self.check(connection):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            usable = self.reset is None or self.reset(connection)
+        except Exception:
+            usable = False
+        if usable:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            self._discard(connection)
+        self._slots.release()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
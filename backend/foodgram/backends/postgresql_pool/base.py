@@ -0,0 +1,75 @@
+"""PostgreSQL с пулом соединений в процессе.
+
+Django держит одно соединение на поток, и под ASGI или gthread их
+открывается столько же, сколько потоков. Этот бэкенд выдает соединения
+из пула на DB_POOL_SIZE штук: поток берет соединение при первом запросе
+к базе и возвращает его, когда Django закрывает соединение в конце
+запроса.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _check(connection):
+    if connection.closed:
+        return False
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+def _reset(connection):
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def get_pool(alias):
+    # После fork воркера gunicorn пул создается заново
+    key = (os.getpid(), alias)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                settings.DB_POOL_SIZE, settings.DB_POOL_TIMEOUT,
+                check=_check, reset=_reset
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        try:
+            connection = get_pool(self.alias).acquire(
+                lambda: connect(conn_params)
+            )
+        except PoolTimeout as error:
+            raise base.Database.OperationalError(str(error)) from error
+        # Для соединения из пула super() не вызывался
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                get_pool(self.alias).release(self.connection)
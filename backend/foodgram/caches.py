@@ -0,0 +1,11 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias='default'):
+    """Видят ли воркеры записи друг друга в кэше alias.
+
+    LocMemCache живет в памяти процесса, DummyCache ничего не хранит.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,10 +87,41 @@ DATABASES = {
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST', ''),
-        'PORT': os.environ.get('DB_PORT')
+        'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# Проверка постоянного соединения в начале запроса (как
+# CONN_HEALTH_CHECKS в Django 4.1)
+DB_CONN_HEALTH_CHECKS = os.environ.get(
+    'DB_CONN_HEALTH_CHECKS', 'False'
+) == 'True'
+
+# Пул соединений воркера для PostgreSQL; 0 - без пула
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+if DB_POOL_SIZE and DATABASES['default']['ENGINE'] == (
+        'django.db.backends.postgresql'):
+    DATABASES['default']['ENGINE'] = 'foodgram.backends.postgresql_pool'
+    # Соединение возвращается в пул в конце каждого запроса
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_LIST_CACHE_ALIAS = os.getenv('RECIPE_LIST_CACHE_ALIAS', 'default')
+
+RECIPE_LIST_CACHE_TIMEOUT = int(os.getenv('RECIPE_LIST_CACHE_TIMEOUT', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -134,12 +168,18 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+IMAGE_MAX_DIMENSION = 2048
+
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
@@ -153,3 +193,51 @@ DJOSER = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+INGREDIENT_AUTOCOMPLETE_MAX_LIMIT = 100
+
+RECIPE_FAST_READ = os.getenv('RECIPE_FAST_READ', 'True') == 'True'
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+
+FEED_BACKFILL = 50
+
+POPULARITY_HALF_LIFE_HOURS = int(os.getenv('POPULARITY_HALF_LIFE_HOURS', 72))
+
+BULK_RECIPES_LIMIT = 100
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 5))
+
+AUTH_TOKEN_LOCAL_ENTRIES = 1024
+
+ASYNC_READS = os.getenv('ASYNC_READS', 'False') == 'True'
+
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', 8))
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', 'True') == 'True'
+
+# Каталог для метрик воркеров gunicorn; пусто - метрики одного процесса
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+METRICS_FLUSH_INTERVAL = 5
+
+# Пусто - /api/_metrics отвечает 404
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+# Поиск N+1 и дубликатов запросов: off, log или raise (по умолчанию в тестах)
+QUERY_DETECTOR = os.getenv('QUERY_DETECTOR', 'raise' if TESTING else 'log')
+
+# Сколько раз форма запроса может повториться за запрос без предупреждения
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', 5))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from users.models import User
-from .models import Favorite, Ingredient, Recipe, Tag
+from .models import Ingredient, Recipe, Tag
 
 
 class RecipeAdmin(admin.ModelAdmin):
@@ -9,11 +9,12 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
 
     def in_favorite(self, obj):
-        return Favorite.objects.filter(recipe=obj).all().count()
+        return obj.favorites_count
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email')
+    list_display = ('username', 'email', 'recipes_count',
+                    'followers_count')
     list_filter = ('username', 'email')
 
 
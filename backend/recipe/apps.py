@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'recipe'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,106 @@
+"""Массовое добавление и удаление рецептов в избранном и корзине.
+
+Строки вставляются одним bulk_create и удаляются одним DELETE, поэтому
+сигналы post_save не приходят, а счетчики удаленных строк сигналы не
+трогают: счетчики, список покупок, события популярности и версия
+пользователя обновляются здесь же. Добавление и удаление одного рецепта
+идут через те же функции.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, popularity, shopping_list
+from .models import Favorite, Recipe, ShoppingCart
+from .signals import bump_on_commit, counted_by_caller
+from .versions import user_state
+
+ADDED = 'added'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+REMOVED = 'removed'
+ABSENT = 'absent'
+
+# Модель -> (счетчик рецепта, вид события популярности)
+LISTS = {
+    Favorite: ('favorites_count', popularity.FAVORITE),
+    ShoppingCart: ('carts_count', popularity.CART),
+}
+
+
+def _unique(recipe_ids):
+    return list(dict.fromkeys(recipe_ids))
+
+
+def lock(user):
+    """Запросы одного пользователя выполняются по очереди, иначе
+    ignore_conflicts скрыл бы строку, вставленную параллельно"""
+    list(type(user).objects.select_for_update().filter(
+        pk=user.pk
+    ).values_list('pk', flat=True))
+
+
+def add(user, model, recipe_ids):
+    """Возвращает {id рецепта: статус} в порядке переданных id"""
+    recipe_ids = _unique(recipe_ids)
+    field, kind = LISTS[model]
+    with transaction.atomic():
+        lock(user)
+        found = set(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', flat=True
+        ))
+        present = set(model.objects.filter(
+            user=user, recipe__in=found
+        ).values_list('recipe_id', flat=True))
+        new = [pk for pk in recipe_ids if pk in found and pk not in present]
+        inserted = set()
+        if new:
+            # Общая метка created отличает свои строки от вставленных
+            # в обход блокировки: их ignore_conflicts пропустил бы
+            created = timezone.now()
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk, created=created)
+                 for pk in new],
+                ignore_conflicts=True
+            )
+            inserted = set(model.objects.filter(
+                user=user, recipe__in=new, created=created
+            ).values_list('recipe_id', flat=True))
+        if inserted:
+            _after_add(user, model, [pk for pk in new if pk in inserted],
+                       field, kind, created)
+    return {
+        pk: NOT_FOUND if pk not in found
+        else ADDED if pk in inserted else EXISTS
+        for pk in recipe_ids
+    }
+
+
+def _after_add(user, model, recipe_ids, field, kind, created):
+    if model is ShoppingCart:
+        shopping_list.add_recipes(user, recipe_ids)
+    counters.increment_many(Recipe, recipe_ids, field)
+    popularity.record_added_many(recipe_ids, kind, created)
+    bump_on_commit(user_state(user.id))
+
+
+def remove(user, model, recipe_ids):
+    """Возвращает {id рецепта: статус} в порядке переданных id"""
+    recipe_ids = _unique(recipe_ids)
+    field, kind = LISTS[model]
+    with transaction.atomic():
+        lock(user)
+        added = dict(model.objects.filter(
+            user=user, recipe__in=recipe_ids
+        ).values_list('recipe_id', 'created'))
+        if added:
+            with counted_by_caller():
+                model.objects.filter(
+                    user=user, recipe__in=list(added)
+                ).delete()
+            removed = sorted(added)
+            if model is ShoppingCart:
+                shopping_list.remove_recipes(user, removed)
+            counters.decrement_many(Recipe, removed, field)
+            popularity.record_removed_many(added.items(), kind)
+            bump_on_commit(user_state(user.id))
+    return {pk: REMOVED if pk in added else ABSENT for pk in recipe_ids}
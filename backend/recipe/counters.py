@@ -0,0 +1,72 @@
+from django.apps import apps as global_apps
+from django.db.models import (BigIntegerField, Count, ExpressionWrapper, F,
+                              IntegerField, OuterRef, Subquery, Sum, Value)
+from django.db.models.functions import Cast, Coalesce
+
+
+def increment(model, pk, field, delta=1):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def decrement(model, pk, field, delta=1):
+    model.objects.filter(pk=pk, **{f'{field}__gte': delta}).update(
+        **{field: F(field) - delta}
+    )
+
+
+def increment_many(model, pks, field):
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + 1})
+
+
+def decrement_many(model, pks, field):
+    model.objects.filter(pk__in=pks, **{f'{field}__gte': 1}).update(
+        **{field: F(field) - 1}
+    )
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def tag_mask(recipe_model):
+    """Маска разрядов тегов рецепта; у каждого тега свой разряд, поэтому
+    сумма равна побитовому ИЛИ"""
+    through = recipe_model.tags.through
+    return Coalesce(Subquery(
+        through.objects.filter(
+            recipe=OuterRef('pk'), tag__bit__isnull=False
+        ).order_by().values('recipe').annotate(
+            mask=Sum(ExpressionWrapper(
+                Cast(Value(1), BigIntegerField()).bitleftshift(F('tag__bit')),
+                output_field=BigIntegerField()
+            ))
+        ).values('mask'),
+        output_field=BigIntegerField()
+    ), 0)
+
+
+def update_tag_masks(queryset):
+    return queryset.update(tag_mask=tag_mask(queryset.model))
+
+
+def recount(apps=global_apps):
+    """Пересчитывает все счетчики: по одному UPDATE на таблицу"""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Favorite = apps.get_model('recipe', 'Favorite')
+    ShoppingCart = apps.get_model('recipe', 'ShoppingCart')
+    Follow = apps.get_model('recipe', 'Follow')
+    User = apps.get_model('users', 'User')
+    recipes = Recipe.objects.update(
+        favorites_count=_count(Favorite, 'recipe'),
+        carts_count=_count(ShoppingCart, 'recipe'),
+    )
+    users = User.objects.update(
+        recipes_count=_count(Recipe, 'author'),
+        followers_count=_count(Follow, 'following'),
+    )
+    return recipes, users
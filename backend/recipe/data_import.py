@@ -1,26 +1,92 @@
+import csv
 import json
-import os
 from pathlib import Path
 
-INITIAL_INGREDIENTS = []
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+DEFAULT_INGREDIENTS = DATA_DIR / 'ingredients.json'
+READ_SIZE = 64 * 1024
+BATCH_SIZE = 2000
 
 
-def fill_initial_data():
-    data_folder = Path(__file__).resolve().parent.parent / 'data'
-    file_path = os.path.join(
-        data_folder, 'ingredients.json'
+def iter_json(path):
+    """Потоковый разбор JSON-массива объектов без загрузки файла целиком"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as source:
+        buffer = ''
+        position = 0
+        started = False
+        eof = False
+        while True:
+            while position < len(buffer) and (
+                    buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != '[':
+                        raise ValueError('Ожидался JSON-массив')
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == ']':
+                    return
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    continue
+            if eof:
+                raise ValueError('Неожиданный конец файла')
+            chunk = source.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def iter_csv(path):
+    with open(path, encoding='utf-8', newline='') as source:
+        for row in csv.reader(source):
+            if len(row) >= 2:
+                yield {'name': row[0], 'measurement_unit': row[1]}
+
+
+def iter_ingredients(path):
+    path = Path(path)
+    rows = iter_csv(path) if path.suffix.lower() == '.csv' else iter_json(
+        path
     )
-    with open(file_path, encoding='utf-8') as ingredients:
-        data = json.load(ingredients)
-        for data_object in data:
-            name = data_object.get('name', None)
-            measurement_unit = data_object.get('measurement_unit', None)
-            INITIAL_INGREDIENTS.append(
-                {
-                    'name': name,
-                    'measurement_unit': measurement_unit
-                }
-            )
-
-
-fill_initial_data()
+    for row in rows:
+        name = (row.get('name') or '').strip()
+        unit = (row.get('measurement_unit') or '').strip()
+        if name and unit:
+            yield name, unit
+
+
+def load_ingredients(model, path, batch_size=BATCH_SIZE, progress=None):
+    """Пакетная вставка ингредиентов с пропуском уже существующих
+    (name, measurement_unit). Возвращает число прочитанных строк."""
+    batch = {}
+    read = 0
+    for name, unit in iter_ingredients(path):
+        read += 1
+        batch[(name, unit)] = None
+        if len(batch) >= batch_size:
+            _insert(model, batch)
+            batch = {}
+            if progress:
+                progress(read)
+    _insert(model, batch)
+    if progress:
+        progress(read)
+    return read
+
+
+def _insert(model, batch):
+    if batch:
+        model.objects.bulk_create(
+            [model(name=name, measurement_unit=unit)
+             for name, unit in batch],
+            ignore_conflicts=True
+        )
@@ -0,0 +1,148 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Гибридная раскладка: рецепты обычных авторов при публикации копируются
+в FeedItem каждого подписчика, рецепты авторов, у которых не меньше
+FEED_FANOUT_LIMIT подписчиков, читаются из Recipe при запросе ленты
+по индексу (author, pub_date). При подписке и пересборке в ленту
+попадают только FEED_BACKFILL последних рецептов автора, поэтому авторы,
+у которых рецептов больше, тоже читаются из Recipe: совпавшие с FeedItem
+рецепты схлопываются. Страница собирается из первых рецептов каждого
+источника за границей курсора.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from users.models import User
+from .models import FeedItem, Follow, Recipe
+
+BATCH_SIZE = 5000
+AUTHORS_CHUNK = 500
+
+
+def is_pulled(followers_count):
+    return followers_count >= settings.FEED_FANOUT_LIMIT
+
+
+def _followers_count(author_id):
+    return User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def _insert(items):
+    """items - тройки (id подписчика, id рецепта, дата публикации)"""
+    batch = []
+    for user_id, recipe_id, pub_date in items:
+        batch.append(FeedItem(user_id=user_id, recipe_id=recipe_id,
+                              pub_date=pub_date))
+        if len(batch) >= BATCH_SIZE:
+            FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _followers(author_id):
+    return Follow.objects.filter(following_id=author_id).values_list(
+        'user_id', flat=True
+    ).iterator()
+
+
+def _recent(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL])
+
+
+def publish(recipe):
+    """Раскладывает новый рецепт подписчикам обычного автора"""
+    if is_pulled(_followers_count(recipe.author_id)):
+        return
+    _insert((user_id, recipe.id, recipe.pub_date)
+            for user_id in _followers(recipe.author_id))
+
+
+def follow(user, author):
+    """Добавляет в ленту последние рецепты нового автора"""
+    if is_pulled(_followers_count(author.id)):
+        return
+    _insert((user.id, recipe_id, pub_date)
+            for recipe_id, pub_date in _recent(author.id))
+
+
+def unfollow(user, author, previous_count):
+    FeedItem.objects.filter(user=user, recipe__author=author).delete()
+    if is_pulled(previous_count) and not is_pulled(
+            _followers_count(author.id)):
+        # Автор снова раскладывается: его последние рецепты читались
+        # при запросе и в лентах подписчиков их нет
+        recent = _recent(author.id)
+        _insert((user_id, recipe_id, pub_date)
+                for user_id in _followers(author.id)
+                for recipe_id, pub_date in recent)
+
+
+def _window(queryset, id_field, limit, position, reverse):
+    """Первые limit пар (дата, id) за position в порядке курсора"""
+    if position is not None:
+        lookup = 'pub_date__gt' if reverse else 'pub_date__lt'
+        queryset = queryset.filter(**{lookup: position})
+    ordering = (('pub_date', id_field) if reverse
+                else ('-pub_date', f'-{id_field}'))
+    return queryset.order_by(*ordering).values_list(
+        'pub_date', id_field
+    )[:limit]
+
+
+def feed_queryset(user, limit, position=None, reverse=False):
+    """Рецепты, среди которых курсорная пагинация найдет страницу.
+
+    limit - сколько рецептов курсор читает за границей position
+    (дата публикации; reverse - в сторону новых). Первые limit
+    рецептов ленты входят в первые limit рецептов одного из источников,
+    поэтому остальные не читаются.
+    """
+    # Пары (дата, id): рецепт из обоих источников попадет в страницу один раз
+    rows = set(_window(FeedItem.objects.filter(user=user), 'recipe_id',
+                       limit, position, reverse))
+    pulled = list(Follow.objects.filter(user=user).filter(
+        Q(following__followers_count__gte=settings.FEED_FANOUT_LIMIT)
+        | Q(following__recipes_count__gt=settings.FEED_BACKFILL)
+    ).values_list('following_id', flat=True))
+    if len(pulled) > 1 and (
+            connection.features.supports_slicing_ordering_in_compound):
+        # Каждая ветка UNION ALL читает recipe_author_pub_date_idx своего
+        # автора не дальше limit строк
+        parts = [_window(Recipe.objects.filter(author_id=author_id), 'id',
+                         limit, position, reverse)
+                 for author_id in pulled]
+        rows.update(parts[0].union(*parts[1:], all=True))
+    elif pulled:
+        rows.update(_window(Recipe.objects.filter(author_id__in=pulled),
+                            'id', limit, position, reverse))
+    page = sorted(rows, reverse=not reverse)[:limit]
+    return Recipe.objects.filter(pk__in=[recipe_id for _, recipe_id in page])
+
+
+@transaction.atomic
+def rebuild():
+    """Заново раскладывает последние рецепты всех обычных авторов"""
+    FeedItem.objects.all().delete()
+    authors = list(User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lt=settings.FEED_FANOUT_LIMIT
+    ).values_list('id', flat=True))
+    recent = {}
+    for start in range(0, len(authors), AUTHORS_CHUNK):
+        for recipe in Recipe.objects.latest_by_author(
+                authors[start:start + AUTHORS_CHUNK], settings.FEED_BACKFILL):
+            recent.setdefault(recipe.author_id, []).append(
+                (recipe.id, recipe.pub_date)
+            )
+    follows = Follow.objects.filter(following_id__in=authors).values_list(
+        'user_id', 'following_id'
+    ).iterator()
+    _insert((user_id, recipe_id, pub_date)
+            for user_id, author_id in follows
+            for recipe_id, pub_date in recent.get(author_id, ()))
+    return FeedItem.objects.count()
@@ -0,0 +1,149 @@
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .versions import RECIPES, bump_version
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+RENDITIONS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+RENDITIONS_DIR = 'images/renditions'
+# Создается последним: его наличие означает, что готовы все размеры
+READY_MARKER = ('full', 'webp')
+
+_executor = None
+
+
+class ImageError(ValueError):
+    pass
+
+
+def _save(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=85,
+                                  optimize=True, progressive=True)
+    elif fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=80, method=4)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_upload(data):
+    """Проверяет загруженную картинку и один раз перекодирует ее:
+    поворот по EXIF, удаление метаданных, ограничение размера"""
+    if len(data) > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ImageError('Слишком большой файл изображения')
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+        if image.format not in ALLOWED_FORMATS:
+            raise ImageError('Неподдерживаемый формат изображения')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.IMAGE_MAX_DIMENSION,) * 2,
+                        Image.Resampling.LANCZOS)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise ImageError('Загрузите корректное изображение') from error
+    has_alpha = image.mode in ('RGBA', 'LA', 'P') and (
+        'transparency' in image.info or image.mode != 'P'
+    )
+    if has_alpha:
+        return ContentFile(_save(image.convert('RGBA'), 'PNG'),
+                           name=f'{uuid.uuid4().hex}.png')
+    return ContentFile(_save(image, 'JPEG'),
+                       name=f'{uuid.uuid4().hex}.jpg')
+
+
+def rendition_name(image_name, rendition, extension):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{RENDITIONS_DIR}/{stem}_{rendition}.{extension}'
+
+
+def _base_extension(image_name):
+    return 'png' if image_name.lower().endswith('.png') else 'jpg'
+
+
+def generate_renditions(image_name):
+    """Создает все размеры картинки и отмечает их готовность в рецептах;
+    маркер готовности в хранилище пишется последним"""
+    extension = _base_extension(image_name)
+    base_format = 'PNG' if extension == 'png' else 'JPEG'
+    with default_storage.open(image_name, 'rb') as source:
+        original = Image.open(source)
+        original.load()
+    original = original.convert('RGBA' if base_format == 'PNG' else 'RGB')
+    outputs = []
+    for rendition, size in RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        outputs.append((rendition, extension, _save(image, base_format)))
+        outputs.append((rendition, 'webp', _save(image, 'WEBP')))
+    outputs.sort(key=lambda output: output[:2] == READY_MARKER)
+    for rendition, ext, content in outputs:
+        name = rendition_name(image_name, rendition, ext)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+    Recipe.objects.filter(image=image_name).update(
+        renditions_ready=True, updated_at=timezone.now()
+    )
+    bump_version(RECIPES)
+
+
+def _generate_safely(image_name):
+    try:
+        generate_renditions(image_name)
+    except Exception:
+        logger.exception('Не удалось создать размеры для %s', image_name)
+    finally:
+        # Потоки пула живут долго: соединение не должно висеть между задачами
+        connection.close()
+
+
+def schedule_renditions(image_name):
+    """Ставит генерацию размеров в пул воркеров после коммита"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions'
+        )
+    transaction.on_commit(lambda: _executor.submit(_generate_safely,
+                                                   image_name))
+
+
+def rendition_names(image_name, ready):
+    """Имена файлов размеров; пока они не готовы (ready из
+    Recipe.renditions_ready) - оригинал"""
+    if not image_name:
+        return {}
+    if not ready:
+        return {
+            f'{rendition}{suffix}': image_name
+            for rendition in RENDITIONS
+            for suffix in ('', '_webp')
+        }
+    extension = _base_extension(image_name)
+    names = {}
+    for rendition in RENDITIONS:
+        names[rendition] = rendition_name(image_name, rendition, extension)
+        names[f'{rendition}_webp'] = rendition_name(image_name, rendition,
+                                                    'webp')
+    return names
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe import shopping_list
+
+
+class Command(BaseCommand):
+    help = ('Сверяет агрегированные списки покупок с корзинами '
+            'и пересобирает таблицу')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='*', dest='users',
+                            help='Проверить только этих пользователей')
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить, без пересборки')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        differences = shopping_list.diff(users)
+        for (user, ingredient), (stored, live) in sorted(
+                differences.items())[:50]:
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: '
+                f'в таблице {stored}, по корзинам {live}'
+            )
+        self.stdout.write(f'Расхождений: {len(differences)}')
+        if options['check']:
+            if differences:
+                raise CommandError('Списки покупок не согласованы')
+            return
+        shopping_list.rebuild(users)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
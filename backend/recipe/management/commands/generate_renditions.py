@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipe import images
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать и уже готовые размеры')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(renditions_ready=False)
+        names = recipes.values_list('image', flat=True).distinct()
+        done = failed = 0
+        for name in names.iterator():
+            try:
+                images.generate_renditions(name)
+                done += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(f'Создано: {done}, ошибок: {failed}')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.data_import import (BATCH_SIZE, DEFAULT_INGREDIENTS,
+                                load_ingredients)
+from recipe.models import Ingredient
+from recipe.versions import INGREDIENTS, bump_version
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из JSON или CSV пакетами, '
+            'пропуская уже существующие (название, единица)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def progress(self, read):
+        self.stdout.write(f'\rОбработано строк: {read}', ending='')
+        self.stdout.flush()
+
+    def handle(self, *args, **options):
+        before = Ingredient.objects.count()
+        try:
+            read = load_ingredients(
+                Ingredient, options['path'], options['batch_size'],
+                progress=self.progress
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        bump_version(INGREDIENTS)
+        created = Ingredient.objects.count() - before
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано: {read}, добавлено: {created}'
+        ))
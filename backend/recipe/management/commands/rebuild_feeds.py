@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipe.feed import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново раскладывает рецепты по лентам подписчиков'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {rebuild()}'
+        ))
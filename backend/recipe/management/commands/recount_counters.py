@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipe.counters import recount, update_tag_masks
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, корзин, рецептов, '
+            'подписчиков и маски тегов')
+
+    def handle(self, *args, **options):
+        recipes, users = recount()
+        update_tag_masks(Recipe.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'
+        ))
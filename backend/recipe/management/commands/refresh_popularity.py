@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipe import popularity
+
+
+class Command(BaseCommand):
+    help = ('Обновляет рейтинг популярных рецептов по событиям с прошлого '
+            'запуска; запускается по расписанию')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать рейтинг целиком')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = popularity.rebuild()
+        else:
+            count = popularity.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлен рейтинг рецептов: {count}'
+        ))
@@ -1,23 +1,19 @@
 from django.db import migrations
-from recipe.data_import import INITIAL_INGREDIENTS
+from recipe.data_import import (DEFAULT_INGREDIENTS, iter_ingredients,
+                                load_ingredients)
 
 
 def add_ingredients(apps, schema_editor):
     Ingredient = apps.get_model('recipe', 'Ingredient')
-    for ingredient in INITIAL_INGREDIENTS:
-        new_ingredient = Ingredient(
-            name=ingredient['name'],
-            measurement_unit=ingredient['measurement_unit'],
-        )
-        new_ingredient.save()
+    load_ingredients(Ingredient, DEFAULT_INGREDIENTS)
 
 
 def remove_ingredients(apps, schema_editor):
     Ingredient = apps.get_model('recipe', 'Ingredient')
-    for ingredient in INITIAL_INGREDIENTS:
-        Ingredient.objects.get(
-            name=ingredient['name'],
-            measurement_unit=ingredient['measurement_unit']
+    for name, measurement_unit in iter_ingredients(DEFAULT_INGREDIENTS):
+        Ingredient.objects.filter(
+            name=name,
+            measurement_unit=measurement_unit
         ).delete()
 
 
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+    totals = RecipeIngredient.objects.filter(
+        recipe__carts__isnull=False
+    ).values('recipe__carts__user', 'ingredient').annotate(
+        total=Sum('amount')
+    ).values_list('recipe__carts__user', 'ingredient', 'total').order_by()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                          amount=total)
+         for user, ingredient, total in totals.iterator()),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe', '0009_alter_favorite_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipe.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:14
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=duplicate['keep'])
+        RecipeIngredient.objects.filter(ingredient__in=extra).update(
+            ingredient_id=duplicate['keep']
+        )
+        for item in ShoppingListItem.objects.filter(ingredient__in=extra):
+            kept, _ = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id, ingredient_id=duplicate['keep']
+            )
+            ShoppingListItem.objects.filter(pk=kept.pk).update(
+                amount=F('amount') + item.amount
+            )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0011_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
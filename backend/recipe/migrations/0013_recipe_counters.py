@@ -0,0 +1,31 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+from recipe.counters import recount
+
+
+def fill_counters(apps, schema_editor):
+    recount(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_unique_ingredient_name_unit'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='в корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='в избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipe import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0015_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
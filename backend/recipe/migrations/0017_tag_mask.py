@@ -0,0 +1,36 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+from recipe.counters import update_tag_masks
+from recipe.models import TAG_MASK_BITS
+
+
+def fill_tag_masks(apps, schema_editor):
+    Tag = apps.get_model('recipe', 'Tag')
+    Recipe = apps.get_model('recipe', 'Recipe')
+    for bit, tag in enumerate(Tag.objects.order_by('id')[:TAG_MASK_BITS]):
+        tag.bit = bit
+        tag.save(update_fields=['bit'])
+    update_tag_masks(Recipe.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0016_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Разряд в маске тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
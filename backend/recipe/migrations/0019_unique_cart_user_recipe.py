@@ -0,0 +1,49 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:33
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_carts(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeIngredient = apps.get_model('recipe', 'RecipeIngredient')
+    ShoppingCart = apps.get_model('recipe', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+    duplicates = ShoppingCart.objects.values(
+        'user', 'recipe'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = duplicate['total'] - 1
+        ShoppingCart.objects.filter(
+            user_id=duplicate['user'], recipe_id=duplicate['recipe']
+        ).exclude(id=duplicate['keep']).delete()
+        # Каждый дубль добавлял ингредиенты в список и счетчик корзин
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id=duplicate['recipe']
+        ).values_list('ingredient_id', 'amount')
+        for ingredient_id, amount in amounts:
+            ShoppingListItem.objects.filter(
+                user_id=duplicate['user'], ingredient_id=ingredient_id,
+                amount__gte=amount * extra
+            ).update(amount=F('amount') - amount * extra)
+        Recipe.objects.filter(
+            pk=duplicate['recipe'], carts_count__gte=extra
+        ).update(carts_count=F('carts_count') - extra)
+    ShoppingListItem.objects.filter(amount__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0018_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_carts, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_cart_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.19 on 2026-10-18 18:11
+
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def mark_ready_renditions(apps, schema_editor):
+    """Готовность раньше проверялась по маркеру в хранилище"""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    names = Recipe.objects.exclude(image='').values_list(
+        'image', flat=True
+    ).distinct()
+    for name in names:
+        stem = os.path.splitext(os.path.basename(name))[0]
+        if default_storage.exists(f'images/renditions/{stem}_full.webp'):
+            Recipe.objects.filter(image=name).update(renditions_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0019_unique_cart_user_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Размеры картинки готовы'),
+        ),
+        migrations.RunPython(
+            mark_ready_renditions, migrations.RunPython.noop
+        ),
+    ]
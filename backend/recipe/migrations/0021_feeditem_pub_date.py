@@ -0,0 +1,37 @@
+# Generated by Django 3.2.19 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_pub_dates(apps, schema_editor):
+    FeedItem = apps.get_model('recipe', 'FeedItem')
+    Recipe = apps.get_model('recipe', 'Recipe')
+    FeedItem.objects.update(pub_date=Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe_id')).values('pub_date')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0020_recipe_renditions_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feeditem',
+            name='pub_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_pub_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='feeditem',
+            name='pub_date',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+    ]
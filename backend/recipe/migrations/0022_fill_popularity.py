@@ -0,0 +1,22 @@
+# Generated by Django 3.2.19 on 2026-10-18 21:05
+
+from django.db import migrations
+
+from recipe.popularity import rebuild
+
+
+def fill_popularity(apps, schema_editor):
+    # У строк, добавленных до 0014, created - время той миграции: до
+    # нее дата добавления не хранилась
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0021_feeditem_pub_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
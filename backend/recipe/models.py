@@ -1,9 +1,14 @@
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 from users.models import User
 
 
 CHARFIELD_LENGTH = 200
+# Число разрядов в Recipe.tag_mask: знаковый BigInteger без старшего бита
+TAG_MASK_BITS = 63
 
 
 class Tag(models.Model):
@@ -12,10 +17,31 @@ class Tag(models.Model):
                             unique=True)
     color = models.CharField(max_length=16)
     slug = models.SlugField('Индификатор', unique=True)
+    bit = models.PositiveSmallIntegerField(
+        'Разряд в маске тегов', null=True, unique=True, editable=False
+    )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = Tag.free_bit()
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def free_bit(used=None):
+        """Первый свободный разряд; теги сверх TAG_MASK_BITS без разряда"""
+        if used is None:
+            used = Tag.objects.filter(bit__isnull=False).values_list(
+                'bit', flat=True
+            )
+        used = set(used)
+        for bit in range(TAG_MASK_BITS):
+            if bit not in used:
+                return bit
+        return None
+
     class Meta:
         ordering = ['name']
 
@@ -35,6 +61,63 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit'
+            )
+        ]
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Автор, теги и ингредиенты фиксированным числом запросов"""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('pk')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки подзапросами EXISTS"""
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author')
+            )),
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом"""
+        if not author_ids:
+            return self.none()
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset.order_by('author_id', '-pub_date', '-id')
+        ranked = queryset.annotate(rank_in_author=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()]
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            'SELECT * FROM (' + sql + ') ranked '
+            'WHERE rank_in_author <= %s '
+            'ORDER BY author_id, pub_date DESC, id DESC',
+            [*params, limit]
+        )
 
 
 class Recipe(models.Model):
@@ -68,14 +151,48 @@ class Recipe(models.Model):
         verbose_name='время готовки'
     )
     pub_date = models.DateTimeField(auto_now_add=True)
-    # objects = RecipeQuerySet.as_manager()
+    updated_at = models.DateTimeField('Изменен', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='в избранном', default=0
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='в корзинах', default=0
+    )
+    tag_mask = models.BigIntegerField(
+        'Маска тегов', default=0, editable=False
+    )
+    renditions_ready = models.BooleanField(
+        'Размеры картинки готовы', default=False, editable=False
+    )
+    objects = RecipeQuerySet.as_manager()
+
+    DENORMALIZED_FIELDS = ('favorites_count', 'carts_count', 'tag_mask',
+                           'renditions_ready')
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Счетчики и маска меняются запросами UPDATE, поэтому
+        сохранение объекта не перезаписывает их значениями из памяти"""
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -120,6 +237,18 @@ class ShoppingCart(models.Model):
         User,
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        'Добавлен',
+        default=timezone.now
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_cart_user_recipe'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -132,6 +261,10 @@ class Favorite(models.Model):
         User,
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        'Добавлен',
+        default=timezone.now
+    )
 
     class Meta:
         constraints = [
@@ -140,3 +273,81 @@ class Favorite(models.Model):
                 name='unique_user_recipe'
             )
         ]
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='количество',
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient'
+            )
+        ]
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика, раскладывается при публикации"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Копия Recipe.pub_date: страница ленты читается по индексу
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+        ]
+
+
+class RecipePopularity(models.Model):
+    """Рейтинг рецепта с затуханием, пересчитывается командой
+    refresh_popularity"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity'
+    )
+    score = models.FloatField('Рейтинг', default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class PopularityEvent(models.Model):
+    """Еще не учтенное в рейтинге добавление или удаление рецепта
+    из избранного или корзины"""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    weight = models.FloatField()
+    created = models.DateTimeField()
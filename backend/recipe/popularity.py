@@ -0,0 +1,119 @@
+"""Рейтинг популярных рецептов с экспоненциальным затуханием.
+
+Вклад каждого добавления в избранное или корзину хранится в единицах
+фиксированной эпохи: weight * 2 ** ((created - EPOCH) / half_life).
+Затухание одинаково для всех рецептов и не меняет порядок, поэтому
+старые рейтинги не нужно пересчитывать: обновление учитывает только
+новые события.
+"""
+import datetime
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import PopularityEvent, RecipePopularity
+from .versions import RECIPES, bump_version
+
+# При полураспаде 72 часа множитель остается в пределах float ~8 лет;
+# сдвиг эпохи не меняет порядок, после него нужен refresh_popularity --full
+EPOCH = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+FAVORITE = 'favorite'
+CART = 'cart'
+WEIGHTS = {
+    FAVORITE: 1.0,
+    CART: 0.5,
+}
+BATCH_SIZE = 1000
+
+
+def decay_factor(moment):
+    half_life = settings.POPULARITY_HALF_LIFE_HOURS * 3600
+    return 2 ** ((moment - EPOCH).total_seconds() / half_life)
+
+
+def record_added_many(recipe_ids, kind, created):
+    """created - время добавления; с ним же record_removed_many снимет
+    ровно этот вклад"""
+    PopularityEvent.objects.bulk_create(
+        PopularityEvent(recipe_id=recipe_id, weight=WEIGHTS[kind],
+                        created=created)
+        for recipe_id in recipe_ids
+    )
+
+
+def record_removed_many(added, kind):
+    """added - пары (id рецепта, время добавления)"""
+    PopularityEvent.objects.bulk_create(
+        PopularityEvent(recipe_id=recipe_id, weight=-WEIGHTS[kind],
+                        created=added_at)
+        for recipe_id, added_at in added
+    )
+
+
+def _save_scores(deltas, replace=False, model=RecipePopularity):
+    ids = list(deltas)
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        model.objects.bulk_create(
+            [model(recipe_id=recipe_id) for recipe_id in chunk],
+            ignore_conflicts=True
+        )
+        rows = list(model.objects.select_for_update().filter(
+            recipe_id__in=chunk
+        ))
+        now = timezone.now()
+        for row in rows:
+            score = deltas[row.recipe_id]
+            row.score = score if replace else max(row.score + score, 0)
+            row.updated_at = now
+        model.objects.bulk_update(rows, ['score', 'updated_at'])
+
+
+@transaction.atomic
+def refresh():
+    """Учитывает события с прошлого запуска и удаляет их.
+
+    Удаляются ровно прочитанные события: событие с меньшим id может
+    закоммититься после чтения, и DELETE по id <= last_id стер бы его,
+    не учтя в рейтинге.
+    """
+    last_id = PopularityEvent.objects.aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return 0
+    deltas = defaultdict(float)
+    processed = []
+    for event_id, recipe_id, weight, created in (
+            PopularityEvent.objects.filter(id__lte=last_id).values_list(
+                'id', 'recipe_id', 'weight', 'created').iterator()):
+        deltas[recipe_id] += weight * decay_factor(created)
+        processed.append(event_id)
+    _save_scores(deltas)
+    for start in range(0, len(processed), BATCH_SIZE):
+        PopularityEvent.objects.filter(
+            pk__in=processed[start:start + BATCH_SIZE]
+        ).delete()
+    transaction.on_commit(lambda: bump_version(RECIPES))
+    return len(deltas)
+
+
+@transaction.atomic
+def rebuild(apps=global_apps):
+    """Полный пересчет по избранному и корзинам"""
+    Favorite = apps.get_model('recipe', 'Favorite')
+    ShoppingCart = apps.get_model('recipe', 'ShoppingCart')
+    Event = apps.get_model('recipe', 'PopularityEvent')
+    Popularity = apps.get_model('recipe', 'RecipePopularity')
+    scores = defaultdict(float)
+    for model, kind in ((Favorite, FAVORITE), (ShoppingCart, CART)):
+        for recipe_id, created in model.objects.values_list(
+                'recipe_id', 'created').iterator():
+            scores[recipe_id] += WEIGHTS[kind] * decay_factor(created)
+    Event.objects.all().delete()
+    Popularity.objects.exclude(recipe_id__in=list(scores)).delete()
+    _save_scores(scores, replace=True, model=Popularity)
+    transaction.on_commit(lambda: bump_version(RECIPES))
+    return len(scores)
@@ -0,0 +1,144 @@
+"""Полнотекстовый поиск по названию и описанию рецепта.
+
+PostgreSQL: вычисляемая колонка tsvector со словарем russian и GIN-индекс.
+SQLite: таблица FTS5 с внешним содержимым, которую синхронизируют
+триггеры на recipe_recipe. В обоих случаях индекс обновляется базой при
+любой вставке и изменении рецепта, в том числе через bulk_create.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+MIGRATION = ('recipe', '0016_recipe_search')
+CONFIG = 'russian'
+TABLE = Recipe._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+# Веса колонок: совпадение в названии важнее, чем в описании
+NAME_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 1.0
+
+POSTGRES_INSTALL = [
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+    f"GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{CONFIG}', coalesce(description, '')), 'B')"
+    f') STORED',
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_search_idx ON {TABLE} '
+    f'USING GIN (search_vector)',
+]
+POSTGRES_UNINSTALL = [
+    f'DROP INDEX IF EXISTS {TABLE}_search_idx',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f'AFTER INSERT ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, name, description) '
+        f'VALUES (new.id, new.name, new.description); END'
+    ),
+    f'{FTS_TABLE}_ad': (
+        f'AFTER DELETE ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) '
+        f"VALUES ('delete', old.id, old.name, old.description); END"
+    ),
+    f'{FTS_TABLE}_au': (
+        f'AFTER UPDATE OF name, description ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) '
+        f"VALUES ('delete', old.id, old.name, old.description); "
+        f'INSERT INTO {FTS_TABLE}(rowid, name, description) '
+        f'VALUES (new.id, new.name, new.description); END'
+    ),
+}
+
+
+def _sqlite_install(cursor):
+    cursor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        f"name, description, content='{TABLE}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+        "AND tbl_name = %s", [TABLE]
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    if existing.issuperset(SQLITE_TRIGGERS):
+        return
+    for name, body in SQLITE_TRIGGERS.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install(db=connection):
+    """Создает индекс; повторный вызов ничего не меняет.
+
+    SQLite пересоздает таблицу при изменении схемы и теряет триггеры,
+    поэтому для него функция вызывается и после каждой миграции.
+    """
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            for sql in POSTGRES_INSTALL:
+                cursor.execute(sql)
+        elif db.vendor == 'sqlite':
+            _sqlite_install(cursor)
+
+
+def uninstall(db=connection):
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            for sql in POSTGRES_UNINSTALL:
+                cursor.execute(sql)
+        elif db.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _stem(word):
+    """Грубая замена стеммеру для FTS5: отбрасывает окончание"""
+    if len(word) > 5:
+        return word[:-2]
+    if len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def fts_query(text):
+    words = re.findall(r'\w+', text.casefold())
+    return ' '.join(f'"{_stem(word)}"*' for word in words)
+
+
+def search(queryset, text):
+    """Отбирает рецепты по запросу и добавляет search_rank"""
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        query = 'websearch_to_tsquery(%s, %s)'
+        params = (CONFIG, text)
+        matches = RawSQL(f'{TABLE}.search_vector @@ {query}', params,
+                         output_field=BooleanField())
+        rank = RawSQL(f'ts_rank_cd({TABLE}.search_vector, {query})', params,
+                      output_field=FloatField())
+    elif vendor == 'sqlite':
+        match = fts_query(text)
+        if not match:
+            return queryset.none()
+        # Соединение с FTS-таблицей: MATCH и bm25 считаются один раз,
+        # а не коррелированным подзапросом на каждую строку
+        return queryset.extra(
+            select={'search_rank': (
+                f'-bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})'
+            )},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {TABLE}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).order_by('-search_rank', '-pub_date', '-id')
+    else:
+        matches = Q(name__icontains=text) | Q(description__icontains=text)
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.filter(matches).annotate(search_rank=rank).order_by(
+        '-search_rank', '-pub_date', '-id'
+    )
@@ -0,0 +1,130 @@
+"""Обновление ShoppingListItem дельтами при изменении корзины и рецептов"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def recipes_amounts(recipe_ids):
+    """Сумма ингредиентов по рецептам, каждый учитывается один раз"""
+    return Counter(dict(
+        RecipeIngredient.objects.filter(recipe__in=recipe_ids).values(
+            'ingredient'
+        ).annotate(total=Sum('amount')).values_list('ingredient', 'total')
+    ))
+
+
+def recipe_amounts(recipe):
+    return recipes_amounts([recipe.pk])
+
+
+def apply_deltas(user_ids, deltas):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    # Один INSERT и один UPDATE на все ингредиенты, а не пара на каждый
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+             for ingredient_id, delta in deltas.items() if delta > 0
+             for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        ).update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            output_field=IntegerField()
+        ))
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, amount__lte=0
+        ).delete()
+
+
+def add_recipes(user, recipe_ids):
+    apply_deltas([user.id], recipes_amounts(recipe_ids))
+
+
+def remove_recipes(user, recipe_ids):
+    amounts = recipes_amounts(recipe_ids)
+    apply_deltas([user.id], {key: -value for key, value in amounts.items()})
+
+
+def _cart_users(recipe):
+    return ShoppingCart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True
+    )
+
+
+def remove_recipe_from_all(recipe):
+    """Вызывается перед удалением рецепта"""
+    amounts = recipe_amounts(recipe)
+    apply_deltas(_cart_users(recipe),
+                 {key: -value for key, value in amounts.items()})
+
+
+def change_recipe(recipe, old_amounts):
+    """Применяет разницу состава рецепта ко всем корзинам с ним"""
+    deltas = recipe_amounts(recipe)
+    deltas.subtract(old_amounts)
+    apply_deltas(_cart_users(recipe), deltas)
+
+
+def live_totals(user_ids=None):
+    """Агрегация по корзинам напрямую, как до материализации"""
+    # Условие на корзины одно: второй filter() по recipe__carts добавил
+    # бы еще один JOIN и умножил суммы на число корзин с рецептом
+    if user_ids is None:
+        queryset = RecipeIngredient.objects.filter(
+            recipe__carts__isnull=False
+        )
+    else:
+        queryset = RecipeIngredient.objects.filter(
+            recipe__carts__user__in=user_ids
+        )
+    return queryset.values(
+        'recipe__carts__user', 'ingredient'
+    ).annotate(total=Sum('amount')).values_list(
+        'recipe__carts__user', 'ingredient', 'total'
+    ).order_by()
+
+
+def stored_totals(user_ids=None):
+    queryset = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user__in=user_ids)
+    return queryset.values_list('user', 'ingredient', 'amount')
+
+
+def diff(user_ids=None):
+    """Расхождения (user, ingredient) -> (в таблице, по корзинам)"""
+    live = {(user, ingredient): total
+            for user, ingredient, total in live_totals(user_ids).iterator()}
+    differences = {}
+    for user, ingredient, amount in stored_totals(user_ids).iterator():
+        total = live.pop((user, ingredient), 0)
+        if amount != total:
+            differences[(user, ingredient)] = (amount, total)
+    for key, total in live.items():
+        differences[key] = (0, total)
+    return differences
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    stored = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        stored = stored.filter(user__in=user_ids)
+    stored.delete()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                          amount=total)
+         for user, ingredient, total in live_totals(user_ids).iterator()),
+        batch_size=5000
+    )
@@ -0,0 +1,212 @@
+import contextlib
+import contextvars
+
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_migrate, post_save, pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import User
+from . import counters, search, shopping_list
+from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .versions import INGREDIENTS, RECIPES, TAGS, bump_version, user_state
+
+# Поля автора, которые попадают в ответ с рецептом
+AUTHOR_FIELDS = frozenset(
+    ('username', 'email', 'first_name', 'last_name')
+)
+
+# Модель строки -> (модель со счетчиком, поле ссылки, счетчик)
+COUNTERS = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'carts_count'),
+    Follow: (User, 'following_id', 'followers_count'),
+}
+
+# False внутри recipe_saved_after(): рецепт сохранится целиком, и строкам
+# состава не нужно обновлять updated_at по одной
+_touch_recipe = contextvars.ContextVar('touch_recipe', default=True)
+# False внутри counted_by_caller(): удаленные строки вызывающий код
+# учтет одним UPDATE на все рецепты
+_count_rows = contextvars.ContextVar('count_rows', default=True)
+
+
+def bump_on_commit(*names):
+    transaction.on_commit(lambda: [bump_version(name) for name in names])
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_on_commit(INGREDIENTS, RECIPES)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_on_commit(TAGS, RECIPES)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, **kwargs):
+    bump_on_commit(RECIPES)
+
+
+@contextlib.contextmanager
+def recipe_saved_after():
+    token = _touch_recipe.set(False)
+    try:
+        yield
+    finally:
+        _touch_recipe.reset(token)
+
+
+@contextlib.contextmanager
+def counted_by_caller():
+    token = _count_rows.set(False)
+    try:
+        yield
+    finally:
+        _count_rows.reset(token)
+
+
+@receiver(post_init, sender=Recipe)
+def recipe_loaded(sender, instance, **kwargs):
+    instance._counted_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_author_changed(sender, instance, created, **kwargs):
+    """Рецепт, переданный другому автору в админке"""
+    previous = instance._counted_author_id
+    instance._counted_author_id = instance.author_id
+    if created or previous is None or previous == instance.author_id:
+        return
+    counters.decrement(User, previous, 'recipes_count')
+    counters.increment(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def counted_row_created(sender, instance, created, **kwargs):
+    """bulk_create сигналов не шлет: bulk.add увеличивает счетчики сам"""
+    if created:
+        model, link, field = COUNTERS[sender]
+        counters.increment(model, getattr(instance, link), field)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def counted_row_deleted(sender, instance, **kwargs):
+    """Удаление через API, из админки и каскадом вместе с рецептом или
+    пользователем"""
+    if _count_rows.get():
+        model, link, field = COUNTERS[sender]
+        counters.decrement(model, getattr(instance, link), field)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    if _touch_recipe.get():
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            updated_at=timezone.now()
+        )
+    bump_on_commit(RECIPES)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+@receiver([post_save, post_delete], sender=Follow)
+def user_state_changed(sender, instance, **kwargs):
+    bump_on_commit(user_state(instance.user_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_on_commit(RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    """Маска тегов и updated_at рецептов при изменении связей"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.filter(pk=instance.pk).update(
+                tag_mask=counters.tag_mask(Recipe), updated_at=timezone.now()
+            )
+        return
+    if action == 'post_add':
+        recipes, change = Recipe.objects.filter(pk__in=pk_set), 'bitor'
+    elif action == 'post_remove':
+        recipes, change = Recipe.objects.filter(pk__in=pk_set), 'bitand'
+    elif action == 'pre_clear':
+        recipes, change = Recipe.objects.filter(tags=instance), 'bitand'
+    else:
+        return
+    fields = {'updated_at': timezone.now()}
+    if instance.bit is not None:
+        bit = 1 << instance.bit
+        fields['tag_mask'] = getattr(F('tag_mask'), change)(
+            bit if change == 'bitor' else ~bit
+        )
+    recipes.update(**fields)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Строки корзин еще на месте: вычитает рецепт из списков покупок
+    и при удалении из админки или каскадом вместе с автором"""
+    shopping_list.remove_recipe_from_all(instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    if instance.bit is not None:
+        Recipe.objects.filter(tags=instance).update(
+            tag_mask=F('tag_mask').bitand(~(1 << instance.bit))
+        )
+
+
+def _author_state(user):
+    # Отложенные поля в __dict__ не попадают и не сохраняются
+    return tuple(user.__dict__.get(name) for name in sorted(AUTHOR_FIELDS))
+
+
+@receiver(post_init, sender=User)
+def author_loaded(sender, instance, **kwargs):
+    instance._author_state = _author_state(instance)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Вход, смена пароля и прочие поля, которых нет в ответе с
+    рецептом, рецепты автора не меняют"""
+    state = _author_state(instance)
+    changed = state != instance._author_state
+    instance._author_state = state
+    if created or not changed or (
+            update_fields is not None
+            and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    if Recipe.objects.filter(author=instance).update(
+            updated_at=timezone.now()):
+        bump_on_commit(RECIPES)
+
+
+@receiver(post_migrate)
+def search_index_installed(sender, using, **kwargs):
+    """SQLite теряет триггеры поиска, когда миграция пересоздает таблицу"""
+    connection = connections[using]
+    if sender.name == 'recipe' and search.MIGRATION in (
+            MigrationRecorder(connection).applied_migrations()):
+        search.install(connection)
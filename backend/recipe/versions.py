@@ -0,0 +1,41 @@
+"""Глобальные версии данных в общем кэше для инвалидации кэшей воркеров.
+
+С кэшем в памяти процесса версию меняет только воркер, выполнивший
+запись: для нескольких воркеров нужен общий кэш (foodgram.caches).
+"""
+import time
+
+from django.core.cache import cache
+
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+TAGS = 'tags'
+
+
+def user_state(user_id):
+    """Версия избранного, корзины и подписок пользователя"""
+    return f'user-state:{user_id}'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), time.time_ns(), None)
+        version = cache.get(_key(name))
+    return version
+
+
+def timestamp(version):
+    """Время изменения по версии, в секундах"""
+    return version / 1e9
+
+
+def bump_version(name):
+    """Новая версия - текущее время в наносекундах"""
+    version = time.time_ns()
+    cache.set(_key(name), version, None)
+    return version
@@ -0,0 +1,81 @@
+"""TokenAuthentication без запроса к базе на каждый запрос.
+
+Пара (пользователь, токен) хранится в общем кэше и в небольшом LRU
+воркера. Запись в общем кэше удаляется при выходе, смене пароля и
+любом сохранении пользователя; LRU других воркеров живет не дольше
+AUTH_TOKEN_LOCAL_TIMEOUT секунд. Кэш в памяти процесса (LocMemCache)
+другие воркеры не видят и не сбросили бы, поэтому с ним используется
+только LRU.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.caches import is_shared
+
+_lock = threading.Lock()
+_local = OrderedDict()
+
+
+def _key(token_key):
+    # Сам токен в ключ кэша не попадает
+    return 'auth-token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _get_local(key):
+    with _lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        expires, credentials = entry
+        if expires < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return credentials
+
+
+def _set_local(key, credentials):
+    expires = time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT
+    with _lock:
+        _local[key] = (expires, credentials)
+        _local.move_to_end(key)
+        while len(_local) > settings.AUTH_TOKEN_LOCAL_ENTRIES:
+            _local.popitem(last=False)
+
+
+def invalidate_token(token_key):
+    key = _key(token_key)
+    with _lock:
+        _local.pop(key, None)
+    cache.delete(key)
+
+
+def invalidate_user(user):
+    for token_key in Token.objects.filter(user=user).values_list(
+            'key', flat=True):
+        invalidate_token(token_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cache_key = _key(key)
+        credentials = _get_local(cache_key)
+        if credentials is None:
+            shared = is_shared()
+            if shared:
+                credentials = cache.get(cache_key)
+            if credentials is None:
+                credentials = super().authenticate_credentials(key)
+                if shared:
+                    cache.set(cache_key, credentials,
+                              settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            _set_local(cache_key, credentials)
+        return credentials
@@ -55,6 +55,16 @@ class User(AbstractUser):
     is_subscribed = models.BooleanField(
         default=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+    )
+
+    DENORMALIZED_FIELDS = ('recipes_count', 'followers_count')
 
     @property
     def is_admin(self):
@@ -62,3 +72,15 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        """Счетчики меняются запросами UPDATE, поэтому сохранение
+        объекта не перезаписывает их значениями из памяти"""
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
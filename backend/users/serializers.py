@@ -1,18 +1,20 @@
 from rest_framework import serializers
 
+from api.fields import ImageRenditionsField
 from recipe.models import Follow, Recipe
 from .models import User
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'cooking_time'
+            'id', 'name', 'image', 'images', 'cooking_time'
         )
         read_only_fields = (
-            'id', 'name', 'image', 'cooking_time'
+            'id', 'name', 'image', 'images', 'cooking_time'
         )
 
 
@@ -23,6 +25,8 @@ class UserSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         if not user.id:
             return False
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         return Follow.objects.filter(user=user, following=obj).exists()
 
     class Meta:
@@ -45,16 +49,18 @@ class UserSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
     def get_recipes(self, obj):
         request = self.context['request']
-        recipes = Recipe.objects.filter(author=obj).all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit and isinstance(recipes_limit, str):
-            recipes_limit = int(recipes_limit)
-            recipes = recipes[:recipes_limit]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes = Recipe.objects.filter(author=obj).all()
+            recipes_limit = request.query_params.get('recipes_limit')
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeShortSerializer(
             recipes,
             many=True,
@@ -62,13 +68,11 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         ).data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context['request'].user
         return Follow.objects.filter(user=user, following=obj).exists()
 
-    def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author=obj).all()
-        return len(recipes)
-
     class Meta:
         model = User
         fields = (
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
@@ -7,7 +9,8 @@ from rest_framework.viewsets import GenericViewSet, ViewSet
 
 from api.pagination import CustomLimitPagination
 from api.permissions import IsAuthenticatedAuthorOrAdmin
-from recipe.models import Follow
+from recipe import feed
+from recipe.models import Follow, Recipe
 from .models import User
 from .serializers import (SetPasswordSerializer, SubscriptionSerializer,
                           UserSerializer)
@@ -19,8 +22,14 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.action == 'subscribe':
             return Follow.objects.filter(user=self.request.user)
-        else:
-            return User.objects.all()
+        queryset = User.objects.all()
+        if self.request.user.is_authenticated:
+            queryset = queryset.annotate(subscribed=Exists(
+                Follow.objects.filter(
+                    user=self.request.user, following=OuterRef('pk')
+                )
+            ))
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'subscribe':
@@ -60,17 +69,23 @@ class UserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             else:
-                Follow.objects.create(user=user, following=following)
+                with transaction.atomic():
+                    Follow.objects.create(user=user, following=following)
+                    feed.follow(user, following)
                 return Response(
                     {'detail': 'Вы подписались на автора'},
                     status=status.HTTP_201_CREATED
                 )
         else:
             try:
-                Follow.objects.filter(
-                    user=user,
-                    following=following,
-                ).delete()
+                with transaction.atomic():
+                    deleted, _ = Follow.objects.filter(
+                        user=user,
+                        following=following,
+                    ).delete()
+                    if deleted:
+                        feed.unfollow(user, following,
+                                      following.followers_count)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             except Follow.DoesNotExist:
                 return Response(
@@ -86,12 +101,38 @@ class SubscriptionListViewSet(mixins.ListModelMixin,
     serializer_class = SubscriptionSerializer
     filter_backends = (filters.SearchFilter, )
     search_fields = ('^following__user', )
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
         user = self.request.user
-        qs = User.objects.filter(following__user=user)
+        qs = User.objects.filter(following__user=user).annotate(
+            subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
         return qs
 
+    def get_recipes_limit(self):
+        try:
+            return int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = list(queryset) if page is None else page
+
+        recipes_by_author = {author.id: [] for author in authors}
+        for recipe in Recipe.objects.latest_by_author(
+                recipes_by_author, self.get_recipes_limit()):
+            recipes_by_author[recipe.author_id].append(recipe)
+        context = self.get_serializer_context()
+        context['recipes_by_author'] = recipes_by_author
+
+        serializer = self.get_serializer(authors, many=True, context=context)
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
 
 class SetPasswordViewSet(ViewSet):
     """User change password"""